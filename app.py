@@ -1,84 +1,645 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
+from flask_socketio import SocketIO
 import cv2
 import numpy as np
 import base64
-from handlers.handwriting_handler import predict_from_image
+import functools
+import math
+import os
+import tempfile
+import time
+import config
+from handlers.handwriting_handler import (
+    predict_from_image,
+    model_version as handwriting_model_version,
+)
+from utils.image_utils import preprocess_image
+from utils import worker_pool
 from handlers.face_handler import (
     predict_from_image as predict_face_from_image,
     predict_from_frame,
-    load_models,
+    mesh_pool,
+    model_version as face_model_version,
+)
+from handlers.face_stream import FaceStream
+from handlers.voice_stream import VoiceStream
+from handlers.batch_handler import BatchError, collect_uploads, run_batch
+from handlers.fusion_handler import parse_weights, run_assessment
+from handlers.video_handler import analyze_video
+from handlers.voice_handler import (
+    predict_from_audio,
+    model_version as voice_model_version,
+)
+from utils.batching import batcher_stats
+from utils.face_mesh_pool import PoolExhausted
+from utils.model_registry import registry
+from utils import compiled_predict, metrics
+from utils.admission import (
+    ComputeExecutor,
+    DeadlineExceeded,
+    InFlightLimiter,
+    Rejected,
+    parse_limits,
 )
-from handlers.voice_handler import predict_from_audio
+from utils.request_input import (
+    MULTIPART_OVERHEAD,
+    BufferReader,
+    InputError,
+    check_size,
+    is_raw,
+    read_body,
+    request_payload,
+    upload_view,
+)
+from utils.result_cache import ResultCache
 
 # ✅ Correct __name__ here
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend access
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+
+# Realtime face streams, keyed by socket session id
+face_streams = {}
+voice_streams = {}
+
+# Results for repeated uploads, keyed by content hash and model version
+result_cache = None
+if config.RESULT_CACHE_ENABLED:
+    result_cache = ResultCache(
+        max_bytes=int(config.RESULT_CACHE_MAX_MB * 1024 * 1024),
+        disk_dir=config.RESULT_CACHE_DIR
+    )
+
+# Registry models behind each modality
+MODALITY_MODELS = {
+    'handwriting': ('handwriting',),
+    'voice': ('voice',),
+    'face': ('face', 'emotion'),
+}
+
+def _enabled_models():
+    return [name for modality in config.ENABLED_MODALITIES
+            for name in MODALITY_MODELS.get(modality, ())]
+
+# Load the enabled models in the background so the server accepts
+# connections right away (in process mode the workers load their own)
+if not worker_pool.enabled():
+    registry.start(_enabled_models(), max_workers=config.MODEL_LOAD_WORKERS)
+
+# Per-request stage timings, /metrics and structured request logs
+if config.REQUEST_LOG:
+    metrics.configure_request_log()
+
+# Probes and scrapes are never refused, and counted in the metrics but not logged
+PROBE_PATHS = ('/health', '/ready', '/metrics')
+
+# Admission control: per-endpoint in-flight caps, and a bounded pool of
+# compute threads so request threads stay free for I/O
+limiter = InFlightLimiter(
+    config.MAX_IN_FLIGHT,
+    {'/api/video': config.VIDEO_MAX_IN_FLIGHT, **parse_limits(config.ENDPOINT_LIMITS)}
+)
+compute_executor = ComputeExecutor(
+    max_workers=config.COMPUTE_WORKERS or os.cpu_count() or 4,
+    max_queue=config.COMPUTE_QUEUE_MAX
+)
+
+@app.before_request
+def start_request_trace():
+    g.arrived = time.monotonic()
+    rule = request.url_rule
+    metrics.start_trace(rule.rule if rule is not None else 'unmatched')
+
+@app.before_request
+def admit_request():
+    """Refuse the request at once when its endpoint is at its in-flight limit"""
+    rule = request.url_rule
+    if rule is None or rule.rule in PROBE_PATHS:
+        return None
+    if not limiter.try_acquire(rule.rule):
+        return (jsonify({'error': 'Too many requests in flight for this endpoint, try again later'}),
+                429, {'Retry-After': '1'})
+    g.admitted = rule.rule
+    return None
+
+@app.after_request
+def finish_request_trace(response):
+    trace = metrics.current_trace()
+    if trace is None:
+        return response
+    fields = {
+        'method': request.method,
+        'path': request.path,
+        'bytes_in': request.content_length or 0,
+    }
+    if response.status_code >= 400 and response.is_json:
+        body = response.get_json(silent=True)
+        if isinstance(body, dict) and 'error' in body:
+            fields['error'] = body['error']
+    log = request.path not in PROBE_PATHS
+    # Streamed (NDJSON) responses are only finished when the body is closed
+    response.call_on_close(lambda: metrics.finish_trace(trace, response.status_code, log=log, **fields))
+    return response
+
+@app.after_request
+def release_admission(response):
+    key = g.pop('admitted', None)
+    if key is not None:
+        # Held until the body is sent, so streamed batch responses count as in flight
+        response.call_on_close(lambda: limiter.release(key))
+    return response
+
+@app.errorhandler(Rejected)
+def rejected_response(e):
+    return jsonify({'error': str(e)}), e.status, {'Retry-After': str(e.retry_after)}
+
+@app.errorhandler(InputError)
+def input_error_response(e):
+    return jsonify({'error': str(e)}), e.status
+
+@app.errorhandler(DeadlineExceeded)
+def deadline_response(e):
+    return jsonify({'error': f'Dropped: {e}', 'dropped': True}), 503
+
+def _traced(trace, fn, *args):
+    with metrics.use_trace(trace):
+        return fn(*args)
 
-# Load face analysis models once at startup
-try:
-    load_models()
-    print("✅ Face analysis models loaded successfully!")
-except Exception as e:
-    print(f"⚠ Warning: Could not load face models: {e}")
+def _offload(fn, *args, deadline=None):
+    """
+    Run request compute on the compute executor and wait for its result.
+    Stages timed on the compute thread count towards the calling request.
+    """
+    return compute_executor.run(_traced, metrics.current_trace(), fn, *args, deadline=deadline)
+
+def requires_modality(modality):
+    """Answer 503 on routes of a modality this server does not serve"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if modality not in config.ENABLED_MODALITIES:
+                return jsonify({'error': f'{modality} analysis is disabled on this server'}), 503
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _respond(result):
+    """Handlers return a result dict, or an (error dict, status) tuple"""
+    if isinstance(result, tuple):
+        body, status = result
+        return jsonify(body), status
+    return jsonify(result)
+
+def _cached(namespace, data, version, compute):
+    """
+    Look the upload up in the result cache; on a miss run compute() and
+    cache the result if it succeeded
+    """
+    if result_cache is None or version is None:
+        return _offload(compute)
+    with metrics.span('cache_lookup'):
+        key = ResultCache.key(namespace, data, version)
+        result = result_cache.get(key)
+    if result is None:
+        result = _offload(compute)
+        # Never cache errors or placeholder results from a mock model
+        if not isinstance(result, tuple) and not result.get('mock'):
+            result_cache.put(key, result)
+    return result
+
+def analyze_handwriting(data):
+    """Handwriting analysis of raw image bytes, through the result cache"""
+    def compute():
+        if worker_pool.enabled():
+            try:
+                with metrics.span('preprocess'):
+                    image = preprocess_image(data)
+            except Exception as e:
+                return {'error': str(e)}, 400
+            return worker_pool.run('handwriting', image)
+        return predict_from_image(data)
+
+    return _cached('handwriting', data, handwriting_model_version(), compute)
+
+def analyze_face_image(data):
+    """Face analysis of raw image bytes, through the result cache"""
+    def compute():
+        if worker_pool.enabled():
+            with metrics.span('imdecode'):
+                frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                return {'error': 'Could not read image'}, 400
+            return worker_pool.run('face', frame)
+        return predict_face_from_image(data)
+
+    return _cached('face_static', data, face_model_version(), compute)
+
+def analyze_voice(data, streaming=None):
+    """Voice analysis of raw audio bytes, through the result cache"""
+    def compute():
+        if worker_pool.enabled():
+            return worker_pool.run('voice', np.frombuffer(data, np.uint8), streaming=streaming)
+        return predict_from_audio(BufferReader(data), streaming=streaming)
+
+    namespace = 'voice_stream' if streaming else 'voice'
+    return _cached(namespace, data, voice_model_version(), compute)
 
 @app.route('/api/handwriting', methods=['POST'])
+@requires_modality('handwriting')
 def handwriting_api():
-    file = request.files.get('image')
-    if not file:
+    data = request_payload(request, 'image')
+    if data is None:
         return jsonify({'error': 'No image uploaded'}), 400
-    result = predict_from_image(file)
-    return jsonify(result)
+    return _respond(analyze_handwriting(data))
 
 @app.route('/api/face/static', methods=['POST'])
+@requires_modality('face')
 def face_static_api():
     """Static image analysis endpoint"""
-    file = request.files.get('image')
-    if not file:
+    data = request_payload(request, 'image')
+    if data is None:
         return jsonify({'error': 'No image uploaded'}), 400
-    result = predict_face_from_image(file)
-    return jsonify(result)
+    return _respond(analyze_face_image(data))
 
 @app.route('/api/face/realtime', methods=['POST'])
+@requires_modality('face')
 def face_realtime_api():
-    """Real-time frame analysis endpoint"""
+    """
+    Real-time frame analysis endpoint: a raw JPEG/PNG body, or JSON with a
+    base64 'frame'
+    """
     try:
-        # Get base64 encoded frame data
-        data = request.get_json()
-        if not data or 'frame' not in data:
+        if is_raw(request):
+            # Binary frame, decoded straight from the request buffer
+            frame = read_body(request, int(config.UPLOAD_MAX_MB * 1024 * 1024))
+            budget_ms = request.args.get('deadline_ms')
+            analyze = analyze_frame_bytes
+        else:
+            # Get base64 encoded frame data
+            data = request.get_json()
+            if not data or 'frame' not in data:
+                return jsonify({'error': 'No frame data provided'}), 400
+            frame = data['frame']
+            budget_ms = data.get('deadline_ms')
+            analyze = analyze_frame
+        if frame is None:
             return jsonify({'error': 'No frame data provided'}), 400
         
-        # Remove data:image/jpeg;base64, or similar prefix
-        image_data = data['frame'].split(',')[1] if ',' in data['frame'] else data['frame']
-        image_bytes = base64.b64decode(image_data)
-        
-        # Convert to numpy array
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if frame is not None:
-            result = predict_from_frame(frame)
-            return jsonify(result)
-        else:
-            return jsonify({'error': 'Invalid frame data'}), 400
-            
+        # A frame that cannot start within its deadline is stale: drop it
+        budget_ms = _deadline_ms(budget_ms)
+        if budget_ms is None:
+            budget_ms = config.REALTIME_FRAME_DEADLINE_MS
+        deadline = g.arrived + budget_ms / 1000.0
+        return _respond(_offload(analyze, frame, deadline=deadline))
+    
+    except (Rejected, DeadlineExceeded, InputError):
+        raise
     except Exception as e:
         print(f"Error processing frame: {e}")
         return jsonify({'error': str(e)}), 500
 
+def _deadline_ms(value):
+    """A client's deadline_ms as a float; None when not given"""
+    if value is None or value == '':
+        return None
+    try:
+        budget_ms = float(value)
+    except (TypeError, ValueError):
+        raise InputError("deadline_ms must be a number")
+    if not budget_ms > 0:
+        # 0 would drop every frame; NaN compares false as well
+        raise InputError("deadline_ms must be a positive number")
+    return budget_ms
+
+def analyze_frame(frame_data):
+    """Decode one base64 realtime frame and analyze it"""
+    # Skip a data:image/jpeg;base64, or similar prefix
+    with metrics.span('base64_decode'):
+        image_bytes = base64.b64decode(frame_data[frame_data.find(',') + 1:])
+    return analyze_frame_bytes(image_bytes)
+
+def analyze_frame_bytes(image_bytes):
+    """Decode one encoded realtime frame (any bytes-like buffer) and analyze it"""
+    if not len(image_bytes):
+        return {'error': 'No frame data provided'}, 400
+    # Convert to numpy array, a view of the buffer
+    with metrics.span('imdecode'):
+        nparr = np.frombuffer(image_bytes, np.uint8)
+        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    
+    if frame is None:
+        return {'error': 'Invalid frame data'}, 400
+    if worker_pool.enabled():
+        return worker_pool.run('face', frame)
+    return predict_from_frame(frame)
+
+@socketio.on('connect', namespace='/face')
+def face_stream_connect():
+    """Start a realtime face session for this client"""
+    if 'face' not in config.ENABLED_MODALITIES:
+        return False
+    sid = request.sid
+    try:
+        stream = FaceStream(
+            emit=lambda event, data: socketio.emit(event, data, to=sid, namespace='/face'),
+            compute=_offload
+        )
+    except PoolExhausted as e:
+        print(f"Rejecting face stream: {e}")
+        return False
+    face_streams[sid] = stream
+    socketio.start_background_task(stream.run)
+
+@socketio.on('frame', namespace='/face')
+def face_stream_frame(data):
+    """
+    Receive one binary JPEG/PNG frame, either as raw bytes or as
+    {'frame': <bytes>, 'id': <frame id>}
+    """
+    stream = face_streams.get(request.sid)
+    if stream is None:
+        return
+    if isinstance(data, dict):
+        stream.push(data.get('frame'), data.get('id'))
+    else:
+        stream.push(data)
+
+@socketio.on('disconnect', namespace='/face')
+def face_stream_disconnect():
+    stream = face_streams.pop(request.sid, None)
+    if stream is not None:
+        stream.close()
+
+@socketio.on('connect', namespace='/voice')
+def voice_stream_connect():
+    """
+    Start a live voice session. The PCM layout comes from the connection
+    query: sample_rate (default 16000), channels (1) and format (int16 or
+    float32)
+    """
+    if 'voice' not in config.ENABLED_MODALITIES:
+        return False
+    if len(voice_streams) >= config.VOICE_STREAM_MAX_SESSIONS:
+        print("Rejecting voice stream: too many open sessions")
+        return False
+    sid = request.sid
+    try:
+        stream = VoiceStream(
+            emit=lambda event, data: socketio.emit(event, data, to=sid, namespace='/voice'),
+            sample_rate=request.args.get('sample_rate', 16000, type=int),
+            channels=request.args.get('channels', 1, type=int),
+            sample_format=request.args.get('format', 'int16')
+        )
+    except Exception as e:
+        print(f"Rejecting voice stream: {e}")
+        return False
+    voice_streams[sid] = stream
+    socketio.start_background_task(stream.run)
+
+@socketio.on('chunk', namespace='/voice')
+def voice_stream_chunk(data):
+    """Receive one binary chunk of PCM samples"""
+    stream = voice_streams.get(request.sid)
+    if stream is not None:
+        stream.push(data)
+
+@socketio.on('disconnect', namespace='/voice')
+def voice_stream_disconnect():
+    stream = voice_streams.pop(request.sid, None)
+    if stream is not None:
+        stream.close()
+
 @app.route('/api/voice', methods=['POST'])
+@requires_modality('voice')
 def voice_api():
-    file = request.files.get('audio')
-    if not file:
+    data = request_payload(request, 'audio')
+    if data is None:
         return jsonify({'error': 'No audio uploaded'}), 400
-    result = predict_from_audio(file)
+    return _respond(analyze_voice(data, streaming=_streaming_requested()))
+
+def _streaming_requested():
+    """
+    ?stream=1 forces windowed streaming voice analysis; by default it is
+    used for recordings longer than VOICE_STREAM_MIN_SECONDS
+    """
+    return True if request.args.get('stream') in ('1', 'true') else None
+
+def _batch_response(field, analyze, max_workers=None):
+    """Stream NDJSON results for every file in `field` and/or an 'archive' zip"""
+    # Before request.files, which would spool the whole body
+    check_size(request.content_length, int(config.BATCH_MAX_TOTAL_MB * 1024 * 1024) + MULTIPART_OVERHEAD)
+    try:
+        items = collect_uploads(request.files.getlist(field), request.files.get('archive'))
+    except BatchError as e:
+        return jsonify({'error': str(e)}), 400
+    if not items:
+        return jsonify({'error': f"No files uploaded (use '{field}' or 'archive')"}), 400
+    return Response(run_batch(items, analyze, max_workers), mimetype='application/x-ndjson')
+
+@app.route('/api/handwriting/batch', methods=['POST'])
+@requires_modality('handwriting')
+def handwriting_batch_api():
+    """Batch handwriting analysis, results streamed as NDJSON"""
+    return _batch_response('images', analyze_handwriting)
+
+@app.route('/api/face/static/batch', methods=['POST'])
+@requires_modality('face')
+def face_static_batch_api():
+    """Batch face image analysis, results streamed as NDJSON"""
+    # No more threads than static FaceMesh instances, or items would be refused as busy
+    return _batch_response('images', analyze_face_image,
+                           min(config.BATCH_API_WORKERS, config.FACE_MESH_POOL_STATIC))
+
+@app.route('/api/voice/batch', methods=['POST'])
+@requires_modality('voice')
+def voice_batch_api():
+    """Batch voice analysis, results streamed as NDJSON"""
+    streaming = _streaming_requested()
+    return _batch_response('audio', lambda data: analyze_voice(data, streaming=streaming))
+
+# Upload field of each modality on the combined assessment endpoint
+ASSESS_FIELDS = {'handwriting': 'image', 'voice': 'audio', 'face': 'face'}
+fusion_weights = parse_weights(config.FUSION_WEIGHTS)
+
+@app.route('/api/assess', methods=['POST'])
+def assess_api():
+    """
+    Combined assessment: any subset of a handwriting 'image', an 'audio'
+    recording and a 'face' image, analyzed concurrently and fused
+    """
+    max_bytes = int(config.UPLOAD_MAX_MB * 1024 * 1024)
+    check_size(request.content_length, len(ASSESS_FIELDS) * max_bytes + MULTIPART_OVERHEAD)
+    inputs = {}
+    for modality, field in ASSESS_FIELDS.items():
+        file = request.files.get(field)
+        if file:
+            # One input buffer per field, all three are in use at once
+            inputs[modality] = upload_view(file, max_bytes, slot=field)
+    if not inputs:
+        return jsonify({'error': "No inputs uploaded (use 'image', 'audio' and/or 'face')"}), 400
+
+    def disabled(modality):
+        return lambda data: ({'error': f'{modality} analysis is disabled on this server'}, 503)
+
+    streaming = _streaming_requested()
+    analyzers = {
+        'handwriting': analyze_handwriting,
+        'voice': lambda data: analyze_voice(data, streaming=streaming),
+        'face': analyze_face_image,
+    }
+    for modality in inputs:
+        if modality not in config.ENABLED_MODALITIES:
+            analyzers[modality] = disabled(modality)
+
+    result = run_assessment(inputs, analyzers, fusion_weights)
+    if result['fused'] is None:
+        # Nothing to fuse: answer with the most severe modality status
+        return jsonify(result), max(m['status'] for m in result['modalities'].values())
     return jsonify(result)
 
+@app.route('/api/video', methods=['POST'])
+@requires_modality('face')
+def video_api():
+    """
+    Face analysis of an uploaded video: a per-segment timeline and an
+    aggregate. ?fps= and ?segment= override the sampling rate and the
+    segment length in seconds.
+    """
+    # Before request.files, which would spool the whole upload
+    if request.content_length and request.content_length > config.VIDEO_MAX_MB * 1024 * 1024 + MULTIPART_OVERHEAD:
+        return jsonify({'error': f'Video exceeds {config.VIDEO_MAX_MB:g} MB'}), 413
+    try:
+        sample_fps = float(request.args['fps']) if 'fps' in request.args else None
+        segment_seconds = float(request.args['segment']) if 'segment' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'fps and segment must be numbers'}), 400
+    if any(value is not None and not (math.isfinite(value) and value > 0)
+           for value in (sample_fps, segment_seconds)):
+        return jsonify({'error': 'fps and segment must be positive numbers'}), 400
+
+    file = request.files.get('video')
+    if not file:
+        return jsonify({'error': 'No video uploaded'}), 400
+
+    # OpenCV reads videos from a path, not from memory
+    suffix = os.path.splitext(file.filename or '')[1] or '.mp4'
+    handle, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            file.save(f)
+        # The pipeline holds one compute thread (its inference stage) for the
+        # length of the video; VIDEO_MAX_IN_FLIGHT bounds how many do
+        return _respond(_offload(analyze_video, path, sample_fps, segment_seconds))
+    finally:
+        os.unlink(path)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'message': 'Voice analysis server is running'})
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """
+    Readiness: 200 once every enabled model has loaded, 503 while any is
+    still loading or failed. In process mode the workers load the models,
+    so the server is ready once the worker pools are up.
+    """
+    if worker_pool.enabled():
+        ready = worker_pool.started()
+        return jsonify({'ready': ready, 'mode': 'process'}), 200 if ready else 503
+    models = registry.status(_enabled_models())
+    ready = all(models.get(name, {}).get('state') == 'ready' for name in _enabled_models())
+    return jsonify({'ready': ready, 'models': models}), 200 if ready else 503
+
+def _collect_service_metrics():
+    """Scrape-time view of model loading, caches, batchers and the FaceMesh pool"""
+    models = registry.status()
+    families = [
+        ('emotion_api_model_ready', 'gauge', '1 once the model has loaded',
+         [({'model': name}, int(s['state'] == 'ready')) for name, s in models.items()]),
+        ('emotion_api_model_load_seconds', 'gauge', 'Time the model took to load',
+         [({'model': name}, s['load_seconds']) for name, s in models.items()]),
+    ]
+
+    batchers = batcher_stats()
+    for key, kind, help in (
+        ('queue_depth', 'gauge', 'Samples waiting for a batch'),
+        ('peak_queue_depth', 'gauge', 'Largest queue depth seen'),
+        ('requests', 'counter', 'Samples submitted to the batcher'),
+        ('batches', 'counter', 'Batched forward passes run'),
+        ('errors', 'counter', 'Batched forward passes that failed'),
+    ):
+        suffix = '_total' if kind == 'counter' else ''
+        families.append((f'emotion_api_batcher_{key}{suffix}', kind, help,
+                         [({'model': name}, s[key]) for name, s in batchers.items()]))
+
+    pool = mesh_pool.stats()
+    families += [
+        ('emotion_api_facemesh_in_use', 'gauge', 'FaceMesh instances in use',
+         [({'mode': 'static'}, pool['static']['in_use']), ({'mode': 'tracking'}, pool['tracking']['in_use'])]),
+        ('emotion_api_facemesh_exhausted_total', 'counter', 'Requests refused because the FaceMesh pool was full',
+         [({}, pool['exhausted'])]),
+        ('emotion_api_face_streams', 'gauge', 'Open realtime face streams', [({}, len(face_streams))]),
+        ('emotion_api_voice_streams', 'gauge', 'Open live voice streams', [({}, len(voice_streams))]),
+    ]
+
+    admission = limiter.stats()
+    compute = compute_executor.stats()
+    families += [
+        ('emotion_api_in_flight', 'gauge', 'Requests being served',
+         [({'endpoint': key}, s['in_flight']) for key, s in admission.items()]),
+        ('emotion_api_admission_rejected_total', 'counter', 'Requests refused with 429 at the in-flight limit',
+         [({'endpoint': key}, s['rejected']) for key, s in admission.items()]),
+        ('emotion_api_compute_queued', 'gauge', 'Compute tasks waiting for a compute thread', [({}, compute['queued'])]),
+        ('emotion_api_compute_rejected_total', 'counter', 'Compute tasks refused with 503 because the queue was full',
+         [({}, compute['rejected'])]),
+        ('emotion_api_compute_expired_total', 'counter', 'Compute tasks dropped because their deadline passed',
+         [({}, compute['expired'])]),
+    ]
+
+    compiled = compiled_predict.stats()
+    families += [
+        ('emotion_api_model_traces_total', 'counter',
+         'Graph traces of compiled models; phase="serving" counts retraces after warm-up',
+         [({'model': name, 'phase': 'warmup'}, c['traces'] - c['retraces']) for name, c in compiled.items()]
+         + [({'model': name, 'phase': 'serving'}, c['retraces']) for name, c in compiled.items()]),
+    ]
+
+    if result_cache is not None:
+        cache = result_cache.stats()
+        families += [
+            ('emotion_api_result_cache_hits_total', 'counter', 'Result cache hits',
+             [({'tier': 'memory'}, cache['hits'] - cache['disk_hits']), ({'tier': 'disk'}, cache['disk_hits'])]),
+            ('emotion_api_result_cache_misses_total', 'counter', 'Result cache misses', [({}, cache['misses'])]),
+            ('emotion_api_result_cache_evictions_total', 'counter', 'Result cache evictions', [({}, cache['evictions'])]),
+            ('emotion_api_result_cache_bytes', 'gauge', 'Result cache memory tier size', [({}, cache['bytes'])]),
+        ]
+    return families
+
+metrics.register_collector(_collect_service_metrics)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_api():
+    """Prometheus text exposition of request, stage and service metrics"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/stats', methods=['GET'])
+def stats_api():
+    """Model load state, inference scheduler, FaceMesh pool, result cache, admission and tracing statistics"""
+    return jsonify({
+        'models': registry.status(),
+        'batching': batcher_stats(),
+        'face_mesh_pool': mesh_pool.stats(),
+        'result_cache': result_cache.stats() if result_cache else None,
+        'admission': limiter.stats(),
+        'compute': compute_executor.stats(),
+        'compiled': compiled_predict.stats()
+    })
+
 # ✅ Correct __name__ and __main__ check
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    if worker_pool.enabled():
+        worker_pool.start()
+    socketio.run(app, debug=True, host='0.0.0.0', port=5000, allow_unsafe_werkzeug=True)
\ No newline at end of file
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Speed and numerical parity of the fused voice front-end against the
+previous two-call librosa path (mfcc + melspectrogram, two STFTs).
+
+    python benchmarks/bench_audio_frontend.py --seconds 5 30 120 --repeat 5
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import librosa
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils.audio_utils import compute_audio_features
+
+SR = 22050
+
+
+def librosa_features(audio, sr=SR, n_mfcc=13, n_mels=128):
+    """The previous extract_audio_features body, after decoding"""
+    mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=n_mfcc)
+    mel_spec = librosa.feature.melspectrogram(y=audio, sr=sr, n_mels=n_mels)
+    mel_spec_db = librosa.power_to_db(mel_spec, ref=np.max)
+    features = np.concatenate([mfccs, mel_spec_db])
+    return (features - np.mean(features)) / np.std(features)
+
+
+def synthetic_speech(seconds, seed=0):
+    """Noise plus a few modulated tones, roughly speech-like in level"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SR)) / SR
+    tones = sum(np.sin(2 * np.pi * f * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)) for f in (180, 420, 950))
+    return (0.05 * tones + 0.01 * rng.standard_normal(len(t))).astype('float32')
+
+
+def best_of(fn, audio, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(audio)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, nargs='+', default=[5, 30, 120])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=1e-3)
+    args = parser.parse_args()
+
+    # Fill the filterbank cache outside the timed runs
+    compute_audio_features(synthetic_speech(1))
+
+    ok = True
+    print(f"{'clip':>8} {'librosa':>12} {'fused':>12} {'speedup':>8} {'max |diff|':>12}")
+    for seconds in args.seconds:
+        audio = synthetic_speech(seconds)
+        diff = float(np.max(np.abs(librosa_features(audio) - compute_audio_features(audio))))
+        ok &= diff <= args.tolerance
+        before = best_of(librosa_features, audio, args.repeat)
+        after = best_of(compute_audio_features, audio, args.repeat)
+        print(f"{seconds:>7.0f}s {before:>10.1f}ms {after:>10.1f}ms {before / after:>7.1f}x {diff:>12.2e}")
+
+    print("parity: OK" if ok else f"parity: FAILED (tolerance {args.tolerance})")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Per-frame latency of face feature extraction, before and after moving
+emotion analysis onto the MediaPipe landmark crop.
+
+    python benchmarks/bench_emotion.py path/to/face.jpg --frames 100 --every-n 5
+
+before: DeepFace.analyze on the full frame (runs its own face detector)
+crop:   emotion model on the landmark crop, every frame
+cadence: emotion model on the landmark crop, every n-th frame
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from deepface import DeepFace
+from handlers.face_handler import (
+    BlinkDetector,
+    EmotionStage,
+    create_face_mesh,
+    extract_features,
+    load_emotion_model,
+)
+
+
+def full_frame_emotion(frame, lm):
+    """The previous behaviour: DeepFace detects the face again on the whole frame"""
+    try:
+        analysis = DeepFace.analyze(frame, actions=['emotion'], enforce_detection=False)
+        if isinstance(analysis, list):
+            analysis = analysis[0]
+        return analysis['dominant_emotion']
+    except Exception:
+        return "neutral"
+
+
+def run(frame, frames, emotion_stage):
+    mesh = create_face_mesh(static_image_mode=False)
+    blink_detector = BlinkDetector()
+    timings = []
+    try:
+        # One untimed frame so model loading and graph tracing are not counted
+        extract_features(frame, blink_detector, mesh, emotion_stage)
+        for _ in range(frames):
+            start = time.perf_counter()
+            extract_features(frame, blink_detector, mesh, emotion_stage)
+            timings.append((time.perf_counter() - start) * 1000.0)
+    finally:
+        mesh.close()
+    return np.array(timings)
+
+
+def report(name, timings):
+    print(f"{name:<10} mean {timings.mean():8.2f} ms   "
+          f"p50 {np.percentile(timings, 50):8.2f} ms   "
+          f"p95 {np.percentile(timings, 95):8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('image', help='image containing one face')
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--every-n', type=int, default=5)
+    args = parser.parse_args()
+
+    frame = cv2.imread(args.image)
+    if frame is None:
+        sys.exit(f"Could not read image: {args.image}")
+
+    load_emotion_model()
+    results = {
+        'before': run(frame, args.frames, full_frame_emotion),
+        'crop': run(frame, args.frames, EmotionStage(1)),
+        'cadence': run(frame, args.frames, EmotionStage(args.every_n)),
+    }
+
+    print(f"{args.frames} frames, {frame.shape[1]}x{frame.shape[0]}, cadence every {args.every_n} frames")
+    for name, timings in results.items():
+        report(name, timings)
+    print(f"speedup (crop):    {results['before'].mean() / results['crop'].mean():.1f}x")
+    print(f"speedup (cadence): {results['before'].mean() / results['cadence'].mean():.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Latency and peak memory of handwriting image preprocessing: the previous
+PIL -> NumPy -> cvtColor -> resize path against the reduced-size grayscale
+decode into a preallocated buffer.
+
+    python benchmarks/bench_image_preprocess.py --megapixels 2 12 24 --repeat 5
+
+Each measurement runs in a fresh process so peak RSS is not shared
+between the two paths.
+"""
+
+import argparse
+import io
+import multiprocessing as mp
+import os
+import resource
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils.image_utils import preprocess_image
+
+
+def previous_preprocess(file):
+    """The previous preprocess_image body"""
+    image = Image.open(io.BytesIO(file.read()))
+    image = np.array(image)
+    if len(image.shape) == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    image = cv2.resize(image, (224, 224))
+    image = image.astype('float32') / 255.0
+    return np.expand_dims(image, axis=-1)
+
+
+def synthetic_scan(megapixels, seed=0):
+    """JPEG bytes of a paper-like page with handwriting-like strokes"""
+    rng = np.random.default_rng(seed)
+    width = int(np.sqrt(megapixels * 1e6 * 4 / 3))
+    height = int(width * 3 / 4)
+    page = np.full((height, width, 3), 235, dtype=np.uint8)
+    page += rng.integers(0, 12, size=(height, width, 1), dtype=np.uint8)
+    for _ in range(400):
+        points = rng.integers(0, [width, height], size=(6, 2)).astype(np.int32)
+        cv2.polylines(page, [points], False, (40, 40, 60), thickness=max(2, width // 800))
+    ok, encoded = cv2.imencode('.jpg', page, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return encoded.tobytes()
+
+
+def _measure(name, data, repeat, queue):
+    fn = previous_preprocess if name == 'previous' else preprocess_image
+    out = np.empty((224, 224, 1), dtype='float32')
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if name == 'previous':
+            fn(io.BytesIO(data))
+        else:
+            fn(io.BytesIO(data), out=out)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux
+    queue.put((min(timings), float(np.median(timings)), (peak - baseline) / 1024.0))
+
+
+def measure(name, data, repeat):
+    ctx = mp.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=_measure, args=(name, data, repeat, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--megapixels', type=float, nargs='+', default=[2, 12, 24])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'image':>8} {'path':>9} {'best':>10} {'median':>10} {'peak +RSS':>11}")
+    for megapixels in args.megapixels:
+        data = synthetic_scan(megapixels)
+        for name in ('previous', 'reduced'):
+            best, median, peak_mb = measure(name, data, args.repeat)
+            print(f"{megapixels:>6.0f}MP {name:>9} {best:>8.1f}ms {median:>8.1f}ms {peak_mb:>9.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
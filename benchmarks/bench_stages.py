@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of every pipeline stage on synthetic inputs.
+
+    python benchmarks/bench_stages.py --repeat 50 --models auto
+    python benchmarks/bench_stages.py --face-image path/to/face.jpg --output stages.json
+
+Stages: base64 and JPEG decode of a realtime frame, handwriting
+preprocess_image, voice extract_audio_features, face extract_features
+(MediaPipe + emotion), and the predict call of each model at batch size 1
+(and at --batch-size for the face MLP).
+
+With --models auto (the default) a model whose weights or runtime are
+missing is replaced by a stub, so the suite runs offline. The results
+file records which models were real. A stage whose dependencies are
+missing altogether (e.g. MediaPipe) is reported as skipped. Results are
+written as JSON (see benchmarks/compare.py).
+
+The synthetic frame does not contain a real face, so without --face-image
+extract_features measures the no-face path.
+"""
+
+import argparse
+import base64
+import io
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmarks import harness
+from benchmarks.stubs import prepare_models
+from handlers import face_handler, handwriting_handler, voice_handler
+from utils.audio_utils import extract_audio_features
+from utils.image_utils import preprocess_image
+
+
+def stage_functions(args):
+    """Stage name -> zero-argument callable"""
+    frame = harness.load_frame(args.face_image)
+    jpeg = harness.encode_jpeg(frame)
+    frame_b64 = base64.b64encode(jpeg)
+    scan = harness.synthetic_scan(args.megapixels)
+    wav = harness.wav_bytes(harness.synthetic_speech(args.seconds))
+    out = np.empty((224, 224, 1), dtype='float32')
+
+    features = np.zeros((1, face_handler.N_FEATURES), dtype='float32')
+    features_batch = np.zeros((args.batch_size, face_handler.N_FEATURES), dtype='float32')
+    emotion_input = np.zeros((1, 48, 48, 1), dtype='float32')
+    handwriting_input = np.zeros((1, 224, 224, 1), dtype='float32')
+    voice_input = extract_audio_features(io.BytesIO(wav))[None]
+
+    blink_detector = face_handler.BlinkDetector()
+
+    return {
+        'base64_decode_frame': lambda: base64.b64decode(frame_b64),
+        'imdecode_frame': lambda: cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR),
+        'preprocess_image': lambda: preprocess_image(io.BytesIO(scan), out=out),
+        'extract_audio_features': lambda: extract_audio_features(io.BytesIO(wav)),
+        'extract_features': lambda: face_handler.extract_features(frame, blink_detector),
+        'face_predict': lambda: face_handler.classify_batch(features),
+        f'face_predict_batch{args.batch_size}': lambda: face_handler.classify_batch(features_batch),
+        'emotion_predict': lambda: face_handler._predict_emotion_batch(emotion_input),
+        'handwriting_predict': lambda: handwriting_handler._predict_batch(handwriting_input),
+        'voice_predict': lambda: voice_handler._predict_batch(voice_input),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--models', choices=('auto', 'stub', 'real'), default='auto')
+    parser.add_argument('--face-image', help='image with a face for extract_features')
+    parser.add_argument('--megapixels', type=float, default=2, help='handwriting scan size')
+    parser.add_argument('--seconds', type=float, default=5, help='voice clip length')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--stages', nargs='+', help='only run these stages')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/...)')
+    args = parser.parse_args()
+
+    models = prepare_models(mode=args.models)
+    results = {}
+    print(f"{'stage':<26} {'p50':>9} {'p95':>9} {'p99':>9} {'mean':>9}")
+    for name, fn in stage_functions(args).items():
+        if args.stages and name not in args.stages:
+            continue
+        try:
+            summary = harness.summarize(harness.time_calls(fn, args.repeat))
+        except Exception as e:
+            results[name] = {'skipped': f"{type(e).__name__}: {e}"}
+            print(f"{name:<26} skipped ({results[name]['skipped']})")
+            continue
+        results[name] = summary
+        print(f"{name:<26} {summary['p50_ms']:>7.3f}ms {summary['p95_ms']:>7.3f}ms "
+              f"{summary['p99_ms']:>7.3f}ms {summary['mean_ms']:>7.3f}ms")
+
+    params = {k: v for k, v in vars(args).items() if k not in ('output', 'stages')}
+    path = harness.write_results('stages', {'params': params, 'models': models, 'stages': results}, args.output)
+    print(f"\nResults written to {path}")
+
+
+if __name__ == '__main__':
+    main()
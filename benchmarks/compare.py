@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark result files of the same kind (stages or load),
+e.g. from two commits:
+
+    python benchmarks/compare.py results/stages-abc123-....json results/stages-def456-....json
+    python benchmarks/compare.py base.json new.json --threshold 10
+
+Prints the change of each latency percentile (and of requests per second
+for load tests) from the first file to the second. Exits non-zero if any
+metric regressed by more than --threshold percent.
+"""
+
+import argparse
+import json
+import sys
+
+LATENCY_KEYS = ('p50_ms', 'p95_ms', 'p99_ms')
+
+
+def _rows(results):
+    """(row name, {metric: value}) of a result file"""
+    if results['kind'] == 'stages':
+        for name, summary in results['stages'].items():
+            if 'skipped' not in summary:
+                yield name, {key: summary[key] for key in LATENCY_KEYS}
+    else:
+        for name, levels in results['endpoints'].items():
+            for level in levels:
+                metrics = {'rps': level['rps']}
+                if level['latency']['n']:
+                    metrics.update({key: level['latency'][key] for key in LATENCY_KEYS})
+                yield f"{name} x{level['concurrency']}", metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10.0, help='regression threshold in percent')
+    args = parser.parse_args()
+
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+    if base['kind'] != new['kind']:
+        parser.error(f"Cannot compare a {base['kind']} result with a {new['kind']} result")
+
+    print(f"{base['meta']['commit']} -> {new['meta']['commit']} ({base['kind']})")
+    if base.get('models') != new.get('models'):
+        print(f"⚠️ Model setups differ: {base.get('models')} vs {new.get('models')}")
+
+    base_rows = dict(_rows(base))
+    regressions = 0
+    for name, metrics in _rows(new):
+        if name not in base_rows:
+            continue
+        changes = []
+        for key, value in metrics.items():
+            before = base_rows[name].get(key)
+            if not before:
+                continue
+            change = (value - before) / before * 100.0
+            # Latency going up, or throughput going down, is a regression
+            worse = change < -args.threshold if key == 'rps' else change > args.threshold
+            regressions += worse
+            changes.append(f"{key} {before:.2f}->{value:.2f} ({change:+.1f}%){' !' if worse else ''}")
+        print(f"{name:<24} " + '  '.join(changes))
+
+    if regressions:
+        print(f"\n{regressions} metric(s) regressed by more than {args.threshold:.0f}%")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Shared pieces of the benchmark suite: timing and percentile summaries,
+synthetic inputs, and machine-readable result files.
+
+Result files are JSON with a 'meta' block (commit, time, machine) so runs
+from different commits can be compared with benchmarks/compare.py.
+"""
+
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+SR = 22050
+
+
+def summarize(timings_ms):
+    """Count, mean and percentiles of a list of millisecond timings"""
+    timings = np.asarray(timings_ms, dtype=float)
+    if timings.size == 0:
+        return {'n': 0}
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    return {
+        'n': int(timings.size),
+        'mean_ms': float(timings.mean()),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'min_ms': float(timings.min()),
+        'max_ms': float(timings.max()),
+    }
+
+
+def time_calls(fn, repeat, warmup=1):
+    """Milliseconds of each of `repeat` calls to fn, after untimed warm-up calls"""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return timings
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True,
+                              timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def metadata():
+    """Where and on what code a benchmark ran"""
+    return {
+        'commit': _git('rev-parse', '--short', 'HEAD') or 'unknown',
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def write_results(kind, results, output=None):
+    """Save results as JSON, by default to benchmarks/results/<kind>-<commit>-<time>.json"""
+    payload = {'kind': kind, 'meta': metadata(), **results}
+    if output is None:
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{kind}-{payload['meta']['commit']}-{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2)
+    return output
+
+
+def synthetic_scan(megapixels=2, seed=0):
+    """JPEG bytes of a paper-like page with handwriting-like strokes"""
+    rng = np.random.default_rng(seed)
+    width = int(np.sqrt(megapixels * 1e6 * 4 / 3))
+    height = int(width * 3 / 4)
+    page = np.full((height, width, 3), 235, dtype=np.uint8)
+    page += rng.integers(0, 12, size=(height, width, 1), dtype=np.uint8)
+    for _ in range(400):
+        points = rng.integers(0, [width, height], size=(6, 2)).astype(np.int32)
+        cv2.polylines(page, [points], False, (40, 40, 60), thickness=max(2, width // 800))
+    return cv2.imencode('.jpg', page, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def synthetic_frame(width=1280, height=720, seed=0):
+    """A camera-like BGR frame with a face-shaped blob (no detectable face)"""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(60, 120, size=(height, width, 3), dtype=np.uint8)
+    center = (width // 2, height // 2)
+    cv2.ellipse(frame, center, (height // 5, height // 4), 0, 0, 360, (140, 170, 210), -1)
+    for dx in (-1, 1):
+        cv2.circle(frame, (center[0] + dx * height // 12, center[1] - height // 16), height // 40, (40, 40, 40), -1)
+    cv2.ellipse(frame, (center[0], center[1] + height // 10), (height // 14, height // 40), 0, 0, 180, (60, 60, 150), 3)
+    return frame
+
+
+def load_frame(path=None):
+    """The BGR frame at path, or a synthetic one"""
+    if path:
+        frame = cv2.imread(path)
+        if frame is None:
+            raise ValueError(f"Could not read image: {path}")
+        return frame
+    return synthetic_frame()
+
+
+def encode_jpeg(frame, quality=85):
+    return cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def synthetic_speech(seconds, seed=0):
+    """Noise plus a few modulated tones, roughly speech-like in level"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SR)) / SR
+    tones = sum(np.sin(2 * np.pi * f * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)) for f in (180, 420, 950))
+    return (0.05 * tones + 0.01 * rng.standard_normal(len(t))).astype('float32')
+
+
+def wav_bytes(audio, sr=SR):
+    """16-bit PCM WAV file bytes (the sample data is the last chunk)"""
+    import soundfile as sf
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sr, format='WAV', subtype='PCM_16')
+    return buffer.getvalue()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Load generator for the HTTP API: drives each endpoint at the given
+concurrency levels and reports p50/p95/p99 latency and requests per second.
+
+    python benchmarks/load_test.py --concurrency 1 4 16 --duration 10
+    python benchmarks/load_test.py --url http://localhost:5000 --endpoints face_realtime voice
+
+Without --url the app is started in this process on a free local port.
+Missing models are replaced by stubs (--models auto), so the test runs
+offline, and the results file records which models were stubbed.
+
+Every request carries a unique payload by default, so the result cache
+is never hit; --repeat-payloads sends identical uploads to measure cache
+hits instead. The realtime Socket.IO stream is not covered, only HTTP
+endpoints. Results are written as JSON (see benchmarks/compare.py).
+"""
+
+import argparse
+import base64
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmarks import harness
+
+BATCH_FILES = 4
+
+
+def multipart(files):
+    """(body, content type) of a multipart/form-data upload of (field, filename, bytes) files"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for field, filename, data in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode() + data + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def unique_jpeg(data, n):
+    # Decoders stop at the JPEG end-of-image marker, trailing bytes only change the hash
+    return data + n.to_bytes(8, 'little')
+
+
+def unique_wav(data, n):
+    # Overwrite the last four samples of the data chunk (the last chunk in the file)
+    return data[:-8] + n.to_bytes(8, 'little')
+
+
+def endpoints(args):
+    """Endpoint name -> (method, path, request builder of a payload number)"""
+    frame = harness.encode_jpeg(harness.load_frame(args.face_image))
+    scan = harness.synthetic_scan(args.megapixels)
+    wav = harness.wav_bytes(harness.synthetic_speech(args.seconds))
+    if args.repeat_payloads:
+        jpeg = audio = lambda data, n: data
+    else:
+        jpeg, audio = unique_jpeg, unique_wav
+
+    def upload(field, data, unique):
+        return lambda n: multipart([(field, 'upload', unique(data, n))])
+
+    def batch(field, data, unique):
+        return lambda n: multipart([(field, f'upload{i}', unique(data, n * BATCH_FILES + i))
+                                    for i in range(BATCH_FILES)])
+
+    def realtime(n):
+        body = json.dumps({'frame': 'data:image/jpeg;base64,' + base64.b64encode(jpeg(frame, n)).decode()})
+        return body.encode(), 'application/json'
+
+    return {
+        'health': ('GET', '/health', None),
+        'ready': ('GET', '/ready', None),
+        'stats': ('GET', '/api/stats', None),
+        'handwriting': ('POST', '/api/handwriting', upload('image', scan, jpeg)),
+        'face_static': ('POST', '/api/face/static', upload('image', frame, jpeg)),
+        'face_realtime': ('POST', '/api/face/realtime', realtime),
+        'face_realtime_raw': ('POST', '/api/face/realtime', lambda n: (jpeg(frame, n), 'image/jpeg')),
+        'voice': ('POST', '/api/voice', upload('audio', wav, audio)),
+        'handwriting_batch': ('POST', '/api/handwriting/batch', batch('images', scan, jpeg)),
+        'face_static_batch': ('POST', '/api/face/static/batch', batch('images', frame, jpeg)),
+        'voice_batch': ('POST', '/api/voice/batch', batch('audio', wav, audio)),
+        'assess': ('POST', '/api/assess', lambda n: multipart([
+            ('image', 'scan', jpeg(scan, n)), ('audio', 'clip', audio(wav, n)), ('face', 'frame', jpeg(frame, n))
+        ])),
+    }
+
+
+def send(base_url, method, path, build, n, timeout):
+    """(status, milliseconds) of one request; status 0 for connection errors"""
+    data, headers = None, {}
+    if build is not None:
+        data, headers['Content-Type'] = build(n)
+    request = urllib.request.Request(base_url + path, data=data, method=method, headers=headers)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = 0
+    return status, (time.perf_counter() - start) * 1000.0
+
+
+def run_level(base_url, endpoint, concurrency, args):
+    """Drive one endpoint with `concurrency` clients for --duration seconds"""
+    method, path, build = endpoint
+    counter = itertools.count()
+    deadline = time.perf_counter() + args.duration
+    samples = []
+    lock = threading.Lock()
+
+    def client():
+        local = []
+        while time.perf_counter() < deadline:
+            local.append(send(base_url, method, path, build, next(counter), args.timeout))
+        with lock:
+            samples.extend(local)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    ok = [ms for status, ms in samples if 200 <= status < 300]
+    return {
+        'concurrency': concurrency,
+        'requests': len(samples),
+        'errors': len(samples) - len(ok),
+        'status': {str(status): count for status, count in sorted(Counter(s for s, _ in samples).items())},
+        'rps': len(ok) / elapsed,
+        'latency': harness.summarize(ok),
+    }
+
+
+def start_local_server(models_mode):
+    """Start the app on a free local port; returns (base url, model status)"""
+    from benchmarks.stubs import prepare_models
+    models = prepare_models(mode=models_mode)
+    from werkzeug.serving import make_server
+    import app as app_module
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', models
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='server to test (default: start the app in-process)')
+    parser.add_argument('--endpoints', nargs='+', help='endpoints to drive (default: all)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--duration', type=float, default=10, help='seconds per endpoint and level')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--models', choices=('auto', 'stub', 'real'), default='auto',
+                        help='model handling for the in-process server')
+    parser.add_argument('--repeat-payloads', action='store_true',
+                        help='send identical uploads (measures result cache hits)')
+    parser.add_argument('--face-image', help='image with a face for the face endpoints')
+    parser.add_argument('--megapixels', type=float, default=2, help='handwriting scan size')
+    parser.add_argument('--seconds', type=float, default=5, help='voice clip length')
+    parser.add_argument('--output', help='results file (default: benchmarks/results/...)')
+    args = parser.parse_args()
+
+    if args.url:
+        base_url, models = args.url.rstrip('/'), None
+    else:
+        base_url, models = start_local_server(args.models)
+
+    available = endpoints(args)
+    unknown = set(args.endpoints or ()) - set(available)
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+    results = {}
+    print(f"{'endpoint':<18} {'conc':>4} {'reqs':>6} {'err':>5} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, endpoint in available.items():
+        if args.endpoints and name not in args.endpoints:
+            continue
+        results[name] = []
+        for concurrency in args.concurrency:
+            level = run_level(base_url, endpoint, concurrency, args)
+            results[name].append(level)
+            latency = level['latency']
+            if latency['n']:
+                timings = f"{latency['p50_ms']:>7.1f}ms {latency['p95_ms']:>7.1f}ms {latency['p99_ms']:>7.1f}ms"
+            else:
+                timings = f"{'-':>9} {'-':>9} {'-':>9}"
+            print(f"{name:<18} {concurrency:>4} {level['requests']:>6} {level['errors']:>5} "
+                  f"{level['rps']:>8.1f} {timings}")
+
+    params = {k: v for k, v in vars(args).items() if k != 'output'}
+    path = harness.write_results('load', {'params': params, 'models': models, 'endpoints': results}, args.output)
+    print(f"\nResults written to {path}")
+
+
+if __name__ == '__main__':
+    main()
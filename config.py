@@ -0,0 +1,157 @@
+"""
+Runtime configuration, read from environment variables
+"""
+
+import os
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+# Micro-batching scheduler (utils/batching.py)
+BATCHING_ENABLED = _env_bool('BATCHING_ENABLED', True)
+BATCH_MAX_SIZE = _env_int('BATCH_MAX_SIZE', 32)
+BATCH_MAX_WAIT_MS = _env_float('BATCH_MAX_WAIT_MS', 5.0)
+# Longest a request waits for its batched prediction before it fails
+BATCH_RESULT_TIMEOUT_SECONDS = _env_float('BATCH_RESULT_TIMEOUT_SECONDS', 60.0)
+
+# Realtime face sessions: run the emotion model on every n-th frame only
+FACE_EMOTION_EVERY_N = _env_int('FACE_EMOTION_EVERY_N', 5)
+
+# Realtime face sessions: run FaceMesh on a FACE_ROI_SIZE square crop around
+# the last face (with FACE_ROI_MARGIN of its size on each side) instead of
+# the full frame, and reuse the previous result for a frame whose thumbnail
+# differs by less than FACE_SKIP_DIFF_THRESHOLD grey levels on average
+# (0 = never), at most FACE_SKIP_MAX frames in a row
+FACE_ROI_TRACKING = _env_bool('FACE_ROI_TRACKING', True)
+FACE_ROI_SIZE = _env_int('FACE_ROI_SIZE', 192)
+FACE_ROI_MARGIN = _env_float('FACE_ROI_MARGIN', 0.25)
+FACE_SKIP_DIFF_THRESHOLD = _env_float('FACE_SKIP_DIFF_THRESHOLD', 2.0)
+FACE_SKIP_MAX = _env_int('FACE_SKIP_MAX', 4)
+
+# Feed the 15 geometric features to the face model. Leave off for the shipped
+# model, which was trained with those slots zero-padded
+FACE_MODEL_EXTENDED_FEATURES = _env_bool('FACE_MODEL_EXTENDED_FEATURES', False)
+
+# Voice: recordings longer than this are analyzed in streaming windows
+VOICE_STREAM_MIN_SECONDS = _env_float('VOICE_STREAM_MIN_SECONDS', 30.0)
+# Window length (STFT frames, ~23 ms each) when the model accepts any length,
+# and stride between windows (0 = no overlap)
+VOICE_WINDOW_FRAMES = _env_int('VOICE_WINDOW_FRAMES', 130)
+VOICE_WINDOW_STRIDE_FRAMES = _env_int('VOICE_WINDOW_STRIDE_FRAMES', 0)
+# Lengths (STFT frames) that clips are zero-padded up to on a compiled model
+# that accepts any length, e.g. '130,260,520,1300'. Off by default: the
+# padding is not masked, so it changes the predictions
+VOICE_LENGTH_BUCKETS = os.environ.get('VOICE_LENGTH_BUCKETS', '')
+
+# Live voice streams (Socket.IO /voice): frames between model runs (~23 ms
+# each, 0 = one window), weight of the newest prediction in the moving
+# average (1 = no smoothing), most unprocessed audio kept per session, and
+# most open sessions
+VOICE_STREAM_STRIDE_FRAMES = _env_int('VOICE_STREAM_STRIDE_FRAMES', 43)
+VOICE_STREAM_SMOOTHING = _env_float('VOICE_STREAM_SMOOTHING', 0.3)
+VOICE_STREAM_MAX_PENDING_SECONDS = _env_float('VOICE_STREAM_MAX_PENDING_SECONDS', 10.0)
+VOICE_STREAM_MAX_SESSIONS = _env_int('VOICE_STREAM_MAX_SESSIONS', 16)
+
+# FaceMesh pool bounds: shared static-image instances, and tracking
+# instances (one per open realtime session)
+FACE_MESH_POOL_STATIC = _env_int('FACE_MESH_POOL_STATIC', 4)
+FACE_MESH_POOL_TRACKING = _env_int('FACE_MESH_POOL_TRACKING', 16)
+
+# Result cache for repeated uploads; RESULT_CACHE_DIR enables the on-disk tier
+RESULT_CACHE_ENABLED = _env_bool('RESULT_CACHE_ENABLED', True)
+RESULT_CACHE_MAX_MB = _env_float('RESULT_CACHE_MAX_MB', 64)
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR', '')
+
+# Batch endpoints: parallel preprocessing threads and upload limits
+BATCH_API_WORKERS = _env_int('BATCH_API_WORKERS', 8)
+BATCH_MAX_FILES = _env_int('BATCH_MAX_FILES', 1000)
+BATCH_MAX_FILE_MB = _env_float('BATCH_MAX_FILE_MB', 50)
+# Total size of a batch: uploaded files plus the unpacked archive members
+BATCH_MAX_TOTAL_MB = _env_float('BATCH_MAX_TOTAL_MB', 500)
+
+# Video analysis (/api/video): frames analyzed per second of video, timeline
+# segment length, face-model batch size, depth of the queues between the
+# decode, feature and inference stages, upload size limit, and videos
+# analyzed at once (each holds a tracking FaceMesh)
+VIDEO_SAMPLE_FPS = _env_float('VIDEO_SAMPLE_FPS', 10.0)
+VIDEO_SEGMENT_SECONDS = _env_float('VIDEO_SEGMENT_SECONDS', 10.0)
+VIDEO_BATCH_SIZE = _env_int('VIDEO_BATCH_SIZE', 32)
+VIDEO_QUEUE_SIZE = _env_int('VIDEO_QUEUE_SIZE', 8)
+VIDEO_MAX_MB = _env_float('VIDEO_MAX_MB', 200)
+VIDEO_MAX_IN_FLIGHT = _env_int('VIDEO_MAX_IN_FLIGHT', 2)
+
+# Uploads to the single-file endpoints (raw body or multipart file), and the
+# largest per-thread input buffer kept for reuse between requests
+UPLOAD_MAX_MB = _env_float('UPLOAD_MAX_MB', 25)
+INPUT_BUFFER_REUSE_MB = _env_float('INPUT_BUFFER_REUSE_MB', 16)
+
+# Combined assessment (/api/assess): per-modality weights of the fused
+# score, e.g. 'handwriting:1,voice:1,face:2'; unlisted modalities weigh 1
+FUSION_WEIGHTS = os.environ.get('FUSION_WEIGHTS', '')
+
+# Production server (serve.py): request/I-O threads and connection bounds
+SERVER_THREADS = _env_int('SERVER_THREADS', 16)
+SERVER_CONNECTION_LIMIT = _env_int('SERVER_CONNECTION_LIMIT', 256)
+SERVER_BACKLOG = _env_int('SERVER_BACKLOG', 128)
+# Threads that run request compute (0 = one per CPU core), and how many
+# more tasks may wait for one before requests are rejected with 503
+COMPUTE_WORKERS = _env_int('COMPUTE_WORKERS', 0)
+COMPUTE_QUEUE_MAX = _env_int('COMPUTE_QUEUE_MAX', 32)
+# Requests one endpoint may serve at once before answering 429, and
+# per-endpoint overrides, e.g. '/api/face/realtime:8,/api/voice:4'
+MAX_IN_FLIGHT = _env_int('MAX_IN_FLIGHT', 32)
+ENDPOINT_LIMITS = os.environ.get('ENDPOINT_LIMITS', '')
+# A realtime frame not started within this many ms of arrival is dropped
+REALTIME_FRAME_DEADLINE_MS = _env_float('REALTIME_FRAME_DEADLINE_MS', 300.0)
+
+# Per-stage timing histograms for /metrics, and one JSON log line per request
+METRICS_ENABLED = _env_bool('METRICS_ENABLED', True)
+REQUEST_LOG = _env_bool('REQUEST_LOG', True)
+
+# Runtime the models are served with: 'keras', or 'tflite' / 'onnx' for
+# files written by export_models.py (missing files fall back to Keras)
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'keras')
+# Per-model backend, e.g. 'voice:keras,face:onnx'
+INFERENCE_BACKEND_OVERRIDES = os.environ.get('INFERENCE_BACKEND_OVERRIDES', '')
+# Exported variant to load: 'fp32', 'fp16' or 'int8'
+INFERENCE_PRECISION = os.environ.get('INFERENCE_PRECISION', 'fp32')
+EXPORTED_MODELS_DIR = os.environ.get('EXPORTED_MODELS_DIR', 'models/exported')
+# Intra-op threads of the TFLite/ONNX runtimes; 0 uses the runtime default
+INFERENCE_BACKEND_THREADS = _env_int('INFERENCE_BACKEND_THREADS', 0)
+
+# Run the face model as a pure-NumPy MLP (scaler folded into the first
+# layer) when it is a plain dense stack and the backend is keras
+FACE_FAST_PATH = _env_bool('FACE_FAST_PATH', True)
+# Serve Keras models through fixed-shape compiled predict functions, traced
+# and warmed up when the model loads (utils/compiled_predict.py)
+COMPILED_PREDICT = _env_bool('COMPILED_PREDICT', True)
+
+# Modalities this server serves; the models of the others are never
+# imported or loaded, and their endpoints answer 503
+ENABLED_MODALITIES = tuple(
+    m.strip() for m in os.environ.get('ENABLED_MODALITIES', 'handwriting,voice,face').split(',') if m.strip()
+)
+# Threads loading the enabled models in the background at startup
+MODEL_LOAD_WORKERS = _env_int('MODEL_LOAD_WORKERS', 3)
+
+# Inference execution mode: 'thread' runs models in the Flask request
+# threads, 'process' sends decoded inputs to worker processes (utils/worker_pool.py)
+INFERENCE_MODE = os.environ.get('INFERENCE_MODE', 'thread')
+WORKER_COUNT = _env_int('WORKER_COUNT', 2)
+# Dedicated pools per model, e.g. 'face:2,voice:1'; unlisted models share WORKER_COUNT workers
+WORKER_AFFINITY = os.environ.get('WORKER_AFFINITY', '')
+# Longest a request waits for a worker; a worker that dies mid-task never answers
+WORKER_TASK_TIMEOUT_SECONDS = _env_float('WORKER_TASK_TIMEOUT_SECONDS', 120.0)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Export the Keras models to TFLite and/or ONNX, optionally quantized, and
+check each exported file against the Keras model.
+
+    python export_models.py --models face handwriting voice \\
+        --formats tflite onnx --precisions fp32 fp16 int8 \\
+        --calibration handwriting=samples/handwriting/ --calibration voice=samples/voice/
+
+Files are written to EXPORTED_MODELS_DIR as <model>.<precision>.<format>,
+where the handlers look for them when INFERENCE_BACKEND is tflite or onnx.
+
+int8 quantization calibrates activation ranges on --calibration data.
+That is a directory of raw samples (face images, handwriting images or
+audio files, preprocessed like the handlers do) or a .npy array of
+already preprocessed model inputs. The same data is used for the
+parity check. Without it, random inputs are used, which is only good
+for a smoke test.
+
+For every export, the tool reports:
+- max/mean absolute difference of the probabilities, and top-1 agreement
+  with Keras;
+- median/p95 latency at batch size 1 and --batch-size;
+- file size;
+- resident memory after loading, measured in a fresh process.
+
+The report is printed and saved as export_report.json. The exit status
+is non-zero when an export's top-1 agreement is below --min-agreement.
+
+ONNX export needs tf2onnx (and onnxconverter-common for fp16), and
+serving it needs onnxruntime. TFLite serving uses tflite-runtime when
+installed, otherwise TensorFlow's interpreter.
+"""
+
+import argparse
+import io
+import json
+import multiprocessing as mp
+import os
+import pickle
+import resource
+import sys
+import time
+
+import numpy as np
+
+import config
+from utils import inference_backend
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac', '.ogg', '.m4a', '.webm')
+
+
+def _keras_loader(name):
+    if name == 'face':
+        from handlers.face_handler import load_keras_model
+    elif name == 'handwriting':
+        from handlers.handwriting_handler import load_keras_model
+    else:
+        from handlers.voice_handler import load_keras_model
+    return load_keras_model
+
+
+def _files(directory, extensions=None):
+    names = sorted(os.listdir(directory))
+    return [os.path.join(directory, n) for n in names
+            if not n.startswith('.') and (extensions is None or n.lower().endswith(extensions))]
+
+
+def _face_inputs(paths):
+    """Scaled feature vectors of face images, as _classify builds them"""
+    import cv2
+    from handlers import face_handler
+    frames = [frame for frame in (cv2.imread(p) for p in paths) if frame is not None]
+    features = face_handler.extract_features_batch(frames)
+    # Images without a detected face stay all-zero rows; they are not useful samples
+    features = features[np.any(features != 0, axis=1)]
+    with open(face_handler.SCALER_PATH, 'rb') as f:
+        scaler = pickle.load(f)
+    return scaler.transform(face_handler._model_input(features))
+
+
+def _handwriting_inputs(paths):
+    from utils.image_utils import preprocess_images
+    files = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            files.append(io.BytesIO(f.read()))
+    return preprocess_images(files)
+
+
+def _voice_inputs(paths, keras_model):
+    from handlers.voice_handler import _fit_length, _model_frames
+    from utils.audio_utils import extract_audio_features
+    # Calibration samples are stacked, so give them all one time length
+    n_frames = _model_frames(keras_model) or config.VOICE_WINDOW_FRAMES
+    features = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            features.append(_fit_length(extract_audio_features(io.BytesIO(f.read())), n_frames))
+    return np.stack(features)
+
+
+def _synthetic_inputs(name, keras_model, count, seed=0):
+    rng = np.random.default_rng(seed)
+    shape = list(keras_model.input_shape[1:])
+    if name == 'voice' and shape[-1] is None:
+        shape[-1] = config.VOICE_WINDOW_FRAMES
+    if name == 'handwriting':
+        return rng.random((count, *shape), dtype=np.float32)
+    return rng.standard_normal((count, *shape)).astype('float32')
+
+
+def load_inputs(name, keras_model, source, count):
+    """Calibration/parity inputs of model `name`, at most count of them"""
+    if not source:
+        print(f"⚠️ No calibration data for {name}, using {count} random inputs")
+        return _synthetic_inputs(name, keras_model, count)
+    if source.endswith('.npy'):
+        inputs = np.load(source)
+    elif name == 'face':
+        inputs = _face_inputs(_files(source)[:count])
+    elif name == 'handwriting':
+        inputs = _handwriting_inputs(_files(source)[:count])
+    else:
+        inputs = _voice_inputs(_files(source, AUDIO_EXTENSIONS)[:count], keras_model)
+    if len(inputs) == 0:
+        raise ValueError(f"No usable calibration samples for {name} in {source}")
+    return np.asarray(inputs[:count], dtype='float32')
+
+
+def export_tflite(keras_model, path, precision, inputs):
+    import tensorflow as tf
+
+    def converter_for(select_ops):
+        converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+        if select_ops:
+            # Recurrent layers may need TF ops that TFLite builtins lack
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS,
+                                                   tf.lite.OpsSet.SELECT_TF_OPS]
+            converter._experimental_lower_tensor_list_ops = False
+        if precision == 'fp16':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+        elif precision == 'int8':
+            # Integer kernels inside; the model keeps float inputs and outputs
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = lambda: ([sample[None]] for sample in inputs)
+        return converter
+
+    try:
+        flatbuffer = converter_for(select_ops=False).convert()
+    except Exception as e:
+        print(f"⚠️ Builtin-only conversion failed ({e}); retrying with TF select ops, "
+              f"which need TensorFlow's interpreter rather than tflite-runtime")
+        flatbuffer = converter_for(select_ops=True).convert()
+    with open(path, 'wb') as f:
+        f.write(flatbuffer)
+
+
+def export_onnx(keras_model, path, precision, inputs):
+    import onnx
+    import tensorflow as tf
+    import tf2onnx
+
+    signature = (tf.TensorSpec((None,) + tuple(keras_model.input_shape[1:]), tf.float32, name='input'),)
+    model_proto, _ = tf2onnx.convert.from_keras(keras_model, input_signature=signature, opset=13)
+
+    if precision == 'fp32':
+        onnx.save(model_proto, path)
+    elif precision == 'fp16':
+        from onnxconverter_common import float16
+        onnx.save(float16.convert_float_to_float16(model_proto, keep_io_types=True), path)
+    else:
+        from onnxruntime.quantization import (
+            CalibrationDataReader, QuantFormat, QuantType, quantize_static,
+        )
+
+        class Reader(CalibrationDataReader):
+            def __init__(self):
+                self._samples = iter(inputs)
+
+            def get_next(self):
+                sample = next(self._samples, None)
+                return None if sample is None else {'input': sample[None]}
+
+        fp32_path = path + '.fp32.tmp'
+        onnx.save(model_proto, fp32_path)
+        try:
+            quantize_static(fp32_path, path, Reader(), quant_format=QuantFormat.QDQ,
+                            per_channel=True, weight_type=QuantType.QInt8)
+        finally:
+            os.remove(fp32_path)
+
+
+EXPORTERS = {'tflite': export_tflite, 'onnx': export_onnx}
+
+
+def parity(reference, candidate, inputs, batch_size):
+    """How closely candidate's probabilities follow the reference model"""
+    expected, actual = [], []
+    for start in range(0, len(inputs), batch_size):
+        batch = inputs[start:start + batch_size]
+        expected.append(reference.predict(batch, verbose=0))
+        actual.append(candidate.predict(batch, verbose=0))
+    expected, actual = np.concatenate(expected), np.concatenate(actual)
+    diff = np.abs(expected - actual)
+    return {
+        'samples': len(inputs),
+        'max_abs_diff': float(diff.max()),
+        'mean_abs_diff': float(diff.mean()),
+        'top1_agreement': float(np.mean(expected.argmax(axis=1) == actual.argmax(axis=1))),
+    }
+
+
+def latency(model, inputs, batch_size, repeat):
+    """Median and p95 milliseconds per predict call"""
+    batch = inputs[:batch_size]
+    if len(batch) < batch_size:
+        batch = np.resize(batch, (batch_size,) + batch.shape[1:])
+    model.predict(batch, verbose=0)  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model.predict(batch, verbose=0)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return {'median_ms': float(np.median(timings)), 'p95_ms': float(np.percentile(timings, 95))}
+
+
+def _measure_rss(name, backend, path, sample, queue):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if backend == 'keras':
+        model = _keras_loader(name)()
+    else:
+        model = inference_backend.open_exported(path, backend)
+    model.predict(sample, verbose=0)
+    # ru_maxrss is in kilobytes on Linux
+    queue.put((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024.0)
+
+
+def load_rss_mb(name, backend, path, sample):
+    """Peak RSS growth from importing the runtime, loading and one predict"""
+    ctx = mp.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=_measure_rss, args=(name, backend, path, sample, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def benchmark(name, backend, path, model, inputs, args):
+    return {
+        'file_mb': os.path.getsize(path) / 1e6 if path else None,
+        'batch_1': latency(model, inputs, 1, args.repeat),
+        f'batch_{args.batch_size}': latency(model, inputs, args.batch_size, args.repeat),
+        'load_rss_mb': load_rss_mb(name, backend, path, inputs[:1]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', nargs='+', choices=('face', 'handwriting', 'voice'),
+                        default=['face', 'handwriting', 'voice'])
+    parser.add_argument('--formats', nargs='+', choices=tuple(EXPORTERS), default=['tflite'])
+    parser.add_argument('--precisions', nargs='+', choices=inference_backend.PRECISIONS, default=['fp32'])
+    parser.add_argument('--calibration', action='append', default=[], metavar='MODEL=PATH',
+                        help='calibration/parity samples of one model (directory or .npy)')
+    parser.add_argument('--samples', type=int, default=200, help='most calibration samples to use')
+    parser.add_argument('--output-dir', default=config.EXPORTED_MODELS_DIR)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--min-agreement', type=float, default=0.98)
+    parser.add_argument('--no-benchmark', action='store_true')
+    args = parser.parse_args()
+
+    calibration = dict(item.split('=', 1) for item in args.calibration)
+    os.makedirs(args.output_dir, exist_ok=True)
+    report = {}
+    failed = False
+
+    for name in args.models:
+        try:
+            keras_model = _keras_loader(name)()
+        except Exception as e:
+            print(f"❌ Could not load the {name} Keras model: {e}")
+            failed = True
+            continue
+        if isinstance(keras_model, str):
+            print(f"⚠️ Skipping {name}: only the mock model is available")
+            continue
+
+        inputs = load_inputs(name, keras_model, calibration.get(name), args.samples)
+        report[name] = {'keras': benchmark(name, 'keras', None, keras_model, inputs, args)
+                        if not args.no_benchmark else {}}
+
+        for backend in args.formats:
+            for precision in args.precisions:
+                label = f"{backend}/{precision}"
+                path = inference_backend.exported_path(name, backend, precision, args.output_dir)
+                try:
+                    EXPORTERS[backend](keras_model, path, precision, inputs)
+                    exported = inference_backend.open_exported(path, backend)
+                    entry = {'path': path, 'parity': parity(keras_model, exported, inputs, args.batch_size)}
+                    if not args.no_benchmark:
+                        entry.update(benchmark(name, backend, path, exported, inputs, args))
+                except Exception as e:
+                    print(f"❌ {name} {label}: {e}")
+                    report[name][label] = {'error': str(e)}
+                    failed = True
+                    continue
+
+                agreement = entry['parity']['top1_agreement']
+                entry['passed'] = agreement >= args.min_agreement
+                failed |= not entry['passed']
+                report[name][label] = entry
+                print(f"{'✅' if entry['passed'] else '❌'} {name} {label}: top-1 agreement {agreement:.3f}, "
+                      f"max |diff| {entry['parity']['max_abs_diff']:.4f} -> {path}")
+
+    print(f"\n{'model':<12} {'variant':<13} {'MB':>7} {'b=1 med':>9} {'b=1 p95':>9} "
+          f"{f'b={args.batch_size} med':>10} {'load RSS':>9}")
+    for name, variants in report.items():
+        for label, entry in variants.items():
+            if 'batch_1' not in entry:
+                continue
+            batched = entry[f'batch_{args.batch_size}']
+            size = f"{entry['file_mb']:.2f}" if entry['file_mb'] is not None else '-'
+            print(f"{name:<12} {label:<13} {size:>7} {entry['batch_1']['median_ms']:>7.2f}ms "
+                  f"{entry['batch_1']['p95_ms']:>7.2f}ms {batched['median_ms']:>8.2f}ms "
+                  f"{entry['load_rss_mb']:>7.0f}MB")
+
+    report_path = os.path.join(args.output_dir, 'export_report.json')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {report_path}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
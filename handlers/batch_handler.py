@@ -0,0 +1,138 @@
+import json
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import config
+from utils import metrics
+from utils.request_input import check_size, upload_view
+
+
+class BatchError(Exception):
+    """The batch request as a whole is unusable (e.g. a corrupt archive)"""
+
+
+def _open_archive(archive):
+    try:
+        return zipfile.ZipFile(archive)
+    except zipfile.BadZipFile as e:
+        raise BatchError(f"Invalid archive: {e}")
+
+
+def _archive_entries(zf):
+    """Every regular file of a zip archive, without reading any of them"""
+    for info in zf.infolist():
+        name = info.filename
+        base = os.path.basename(name)
+        # Skip directories and OS metadata (__MACOSX/, .DS_Store, ...)
+        if info.is_dir() or not base or base.startswith('.') or name.startswith('__MACOSX/'):
+            continue
+        yield info
+
+
+class _Budget:
+    """File count and total byte limits of one batch, checked before anything is read"""
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.max_total = int(config.BATCH_MAX_TOTAL_MB * 1024 * 1024)
+
+    def add_file(self):
+        self.files += 1
+        if self.files > config.BATCH_MAX_FILES:
+            raise BatchError(f"Too many files (limit {config.BATCH_MAX_FILES})")
+
+    def add_bytes(self, size):
+        self.bytes += size
+        check_size(self.bytes, self.max_total)
+
+
+def collect_uploads(files, archive=None):
+    """
+    Gather the batch as a list of (filename, buffer) from multipart files
+    and/or one zip archive. Unreadable or oversized archive members are
+    kept as (filename, BatchError) so they get their own error line.
+
+    Limits are enforced as the batch is gathered: the file count and the
+    total size (BATCH_MAX_TOTAL_MB, counted from the declared sizes of
+    archive members) raise before the offending file is read, and a
+    multipart file over BATCH_MAX_FILE_MB is refused with 413.
+    """
+    max_bytes = int(config.BATCH_MAX_FILE_MB * 1024 * 1024)
+    budget = _Budget()
+    items = []
+    for file in files:
+        if not file:
+            continue
+        budget.add_file()
+        # A buffer of its own: items outlive the request thread's reusable buffers
+        data = upload_view(file, max_bytes, slot=None)
+        budget.add_bytes(len(data))
+        items.append((file.filename, data))
+
+    if archive:
+        with _open_archive(archive) as zf:
+            for info in _archive_entries(zf):
+                budget.add_file()
+                if info.file_size > max_bytes:
+                    items.append((info.filename, BatchError(f"File exceeds {config.BATCH_MAX_FILE_MB} MB")))
+                    continue
+                # Reads stop at the declared size, so it bounds the member's memory
+                budget.add_bytes(info.file_size)
+                try:
+                    items.append((info.filename, zf.read(info)))
+                except Exception as e:
+                    items.append((info.filename, BatchError(f"Could not extract file: {e}")))
+    return items
+
+
+def _analyze_one(analyze, data, trace=None):
+    """Run one item, turning every failure into an error result"""
+    if isinstance(data, Exception):
+        return {'error': str(data)}, 400
+    try:
+        # Stage timings of every item count towards the batch request
+        with metrics.use_trace(trace):
+            result = analyze(data)
+    except Exception as e:
+        # Admission rejections carry their own status (503 when the server is full)
+        return {'error': str(e)}, getattr(e, 'status', 500)
+    if isinstance(result, tuple):
+        return result
+    return result, 200
+
+
+def run_batch(items, analyze, max_workers=None):
+    """
+    Analyze all items concurrently and yield one NDJSON line per item as
+    soon as it is ready, followed by a summary line.
+
+    Preprocessing runs in parallel threads; model calls from those threads
+    meet in the shared micro-batcher, so they run as batched forward passes.
+    A failing item produces an error line and does not stop the batch.
+    """
+    started = time.perf_counter()
+    errors = 0
+    trace = metrics.current_trace()
+    with ThreadPoolExecutor(max_workers=max_workers or config.BATCH_API_WORKERS) as executor:
+        futures = {
+            executor.submit(_analyze_one, analyze, data, trace): (index, name)
+            for index, (name, data) in enumerate(items)
+        }
+        for future in as_completed(futures):
+            index, name = futures[future]
+            result, status = future.result()
+            if status != 200:
+                errors += 1
+            yield json.dumps({'index': index, 'filename': name, 'status': status, 'result': result}) + '\n'
+
+    yield json.dumps({
+        'summary': {
+            'files': len(items),
+            'succeeded': len(items) - errors,
+            'failed': errors,
+            'elapsed_ms': (time.perf_counter() - started) * 1000.0
+        }
+    }) + '\n'
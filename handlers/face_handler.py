@@ -1,18 +1,39 @@
 import cv2
 import numpy as np
 import pickle
-from tensorflow.keras.models import load_model
-from deepface import DeepFace
-import mediapipe as mp
 import os
+import time
+from collections import deque
+from utils.batching import predict_one
+from utils.face_mesh_pool import FaceMeshPool, PoolExhausted
+from utils.result_cache import model_version as model_version_of
+from utils.model_registry import registry, ModelUnavailable
+from utils import inference_backend
+from utils.dense_mlp import DenseMLP, NotADenseStack
+from utils.metrics import span
+from utils.request_input import as_buffer
+import config
 
-# MediaPipe setup
-mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh(
-    max_num_faces=1,
-    refine_landmarks=True,
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5
+# TensorFlow, DeepFace and MediaPipe are imported where they are first
+# needed, so importing this module stays cheap
+
+def create_face_mesh(static_image_mode=False):
+    """Create a FaceMesh instance with the settings used across the app"""
+    import mediapipe as mp
+    return mp.solutions.face_mesh.FaceMesh(
+        static_image_mode=static_image_mode,
+        max_num_faces=1,
+        refine_landmarks=True,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5
+    )
+
+# Static images borrow a static_image_mode instance per request; realtime
+# sessions get their own tracking instance for as long as they are open
+mesh_pool = FaceMeshPool(
+    create_face_mesh,
+    max_static=config.FACE_MESH_POOL_STATIC,
+    max_tracking=config.FACE_MESH_POOL_TRACKING
 )
 
 EYE_AR_THRESH = 0.25
@@ -35,75 +56,343 @@ def map_emotion(emotion):
     mapping = {'angry': 0, 'disgust': 1, 'fear': 2, 'happy': 3, 'sad': 4, 'surprise': 5, 'neutral': 6}
     return mapping.get(emotion.lower(), 6)
 
-def extract_features(frame, blink_detector):
-    """Extract facial features from frame"""
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    result = face_mesh.process(rgb)
-    features = np.zeros(20)  # Match your trained feature count
+# Emotion model (DeepFace's 48x48 grayscale CNN), run on landmark crops
+EMOTION_LABELS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
 
-    if result.multi_face_landmarks:
-        lm = result.multi_face_landmarks[0].landmark
-        try:
-            # EAR (Eye Aspect Ratio)
-            left_eye_idx = [362, 385, 387, 263, 373, 380]
-            right_eye_idx = [33, 160, 158, 133, 153, 144]
-            def ear(pts): return (
-                np.linalg.norm(np.array(pts[1]) - np.array(pts[5])) +
-                np.linalg.norm(np.array(pts[2]) - np.array(pts[4]))
-            ) / (2.0 * np.linalg.norm(np.array(pts[0]) - np.array(pts[3])) + 1e-6)
-
-            left_pts = [(lm[i].x, lm[i].y) for i in left_eye_idx]
-            right_pts = [(lm[i].x, lm[i].y) for i in right_eye_idx]
-            avg_ear = (ear(left_pts) + ear(right_pts)) / 2
-
-            # Blink
-            blink = blink_detector.update(avg_ear)
-
-            # Brow Drop
-            brow = np.mean([lm[i].y for i in [337, 336, 296, 334]])
-            eye = np.mean([lm[i].y for i in [463, 414, 286]])
-            brow_drop = (brow - eye) * 1000
-
-            # Lip Tightness
-            lip_w = lm[308].x - lm[78].x
-            lip_h = lm[14].y - lm[13].y
-            lip_tight = (lip_w / (lip_h + 1e-6)) * 100
-
-            # Emotion
+def _load_emotion_model():
+    from deepface import DeepFace
+    built = DeepFace.build_model('Emotion')
+    # Newer DeepFace versions wrap the Keras model in a client object
+    return inference_backend.compiled('emotion', getattr(built, 'model', built))
+
+registry.register('emotion', _load_emotion_model)
+
+def load_emotion_model():
+    """DeepFace's emotion model, loaded once through the model registry"""
+    return registry.get('emotion')
+
+def crop_face(frame, pts, margin=0.15):
+    """Square crop around the (478, 3) landmark array, with a relative margin"""
+    h, w = frame.shape[:2]
+    (x_min, y_min), (x_max, y_max) = pts[:, :2].min(axis=0), pts[:, :2].max(axis=0)
+    cx = (x_min + x_max) / 2 * w
+    cy = (y_min + y_max) / 2 * h
+    half = max((x_max - x_min) * w, (y_max - y_min) * h) * (1 + 2 * margin) / 2
+    x0, x1 = max(int(cx - half), 0), min(int(cx + half), w)
+    y0, y1 = max(int(cy - half), 0), min(int(cy + half), h)
+    return frame[y0:y1, x0:x1]
+
+def _predict_emotion_batch(batch):
+    """Run the emotion model on a batch of 48x48 grayscale faces"""
+    return load_emotion_model().predict(batch, verbose=0)
+
+def predict_emotion(face_crop):
+    """Dominant emotion of an already-cropped BGR face"""
+    gray = cv2.cvtColor(face_crop, cv2.COLOR_BGR2GRAY)
+    gray = cv2.resize(gray, (48, 48), interpolation=cv2.INTER_AREA)
+    face = np.expand_dims(gray.astype('float32') / 255.0, axis=-1)
+    prediction = predict_one('emotion', _predict_emotion_batch, face)
+    return EMOTION_LABELS[int(np.argmax(prediction))]
+
+class EmotionStage:
+    """
+    Emotion analysis on the landmark crop. With every_n > 1 the model only
+    runs on every n-th frame and the last result is carried forward.
+    """
+
+    def __init__(self, every_n=1):
+        self.every_n = max(1, int(every_n))
+        self.last = "neutral"
+        self._frames = 0
+
+    def __call__(self, frame, pts):
+        if self._frames % self.every_n == 0:
             try:
-                analysis = DeepFace.analyze(frame, actions=['emotion'], enforce_detection=False)
-                emotion = analysis[0]['dominant_emotion']
-            except:
-                emotion = "neutral"
-            emo_encoded = map_emotion(emotion)
+                self.last = predict_emotion(crop_face(frame, pts))
+            except Exception as e:
+                print("⛔ Emotion analysis failed:", e)
+                self.last = "neutral"
+        self._frames += 1
+        return self.last
+
+# Feature vector layout: the five features the model was trained on,
+# followed by geometric features that fill the remaining slots
+N_FEATURES = 20
+N_BASE_FEATURES = 5
+GEOMETRIC_FEATURE_NAMES = [
+    'left_eye_aspect_ratio', 'right_eye_aspect_ratio', 'eye_asymmetry',
+    'mouth_aspect_ratio', 'mouth_width', 'left_brow_raise', 'right_brow_raise',
+    'brow_furrow', 'lip_corner_droop', 'jaw_drop', 'head_yaw', 'head_pitch',
+    'head_roll', 'face_aspect_ratio', 'gaze_offset'
+]
+
+# Landmark index arrays (MediaPipe FaceMesh with refine_landmarks, 478 points)
+EYE_IDX = np.array([
+    [362, 385, 387, 263, 373, 380],  # left eye
+    [33, 160, 158, 133, 153, 144],   # right eye
+])
+BROW_DROP_IDX = np.array([337, 336, 296, 334])
+BROW_DROP_EYE_IDX = np.array([463, 414, 286])
+BROW_IDX = np.array([[336, 296, 334], [107, 66, 105]])
+UPPER_LID_IDX = np.array([386, 159])
+IRIS_IDX = np.array([473, 468])
+LIP_CORNERS_IDX = np.array([61, 291])
+LIP_INNER_IDX = np.array([13, 14])
+NOSE_TIP, CHIN, FOREHEAD = 1, 152, 10
+FACE_LEFT, FACE_RIGHT = 234, 454
+EYE_OUTER = np.array([33, 263])
+
+def landmarks_to_array(lm):
+    """(478, 3) float array of normalized landmark coordinates, built in one pass"""
+    return np.fromiter(
+        (c for p in lm for c in (p.x, p.y, p.z)), dtype=np.float64, count=3 * len(lm)
+    ).reshape(-1, 3)
+
+def _dist(a, b):
+    return np.linalg.norm(a - b, axis=-1)
+
+def geometric_features(pts):
+    """
+    Geometric features for landmark arrays of shape (N, 478, 3), computed
+    in one vectorized pass. Returns an (N, 18) array: EAR, brow drop and
+    lip tightness followed by the 15 GEOMETRIC_FEATURE_NAMES features.
+    """
+    xy = pts[..., :2]
+    eps = 1e-6
+
+    # EAR (Eye Aspect Ratio) for both eyes at once: (N, 2)
+    eye = xy[:, EYE_IDX]
+    ear = (_dist(eye[..., 1, :], eye[..., 5, :]) + _dist(eye[..., 2, :], eye[..., 4, :])) / (
+        2.0 * _dist(eye[..., 0, :], eye[..., 3, :]) + eps)
+    avg_ear = ear.mean(axis=1)
+
+    # Brow Drop
+    brow_drop = (xy[:, BROW_DROP_IDX, 1].mean(axis=1) - xy[:, BROW_DROP_EYE_IDX, 1].mean(axis=1)) * 1000
+
+    # Lip Tightness
+    lip_w = xy[:, 308, 0] - xy[:, 78, 0]
+    lip_h = xy[:, 14, 1] - xy[:, 13, 1]
+    lip_tight = (lip_w / (lip_h + eps)) * 100
+
+    # Scale references: inter-ocular distance and face size
+    iod = _dist(xy[:, EYE_OUTER[0]], xy[:, EYE_OUTER[1]]) + eps
+    face_w = _dist(xy[:, FACE_LEFT], xy[:, FACE_RIGHT]) + eps
+    face_h = _dist(xy[:, FOREHEAD], xy[:, CHIN]) + eps
+
+    mouth_w = _dist(xy[:, LIP_CORNERS_IDX[0]], xy[:, LIP_CORNERS_IDX[1]])
+    mouth_open = _dist(xy[:, LIP_INNER_IDX[0]], xy[:, LIP_INNER_IDX[1]])
+    brow_raise = (xy[:, UPPER_LID_IDX, 1] - xy[:, BROW_IDX, 1].mean(axis=2)) / iod[:, None]
+    lip_center_y = xy[:, LIP_INNER_IDX, 1].mean(axis=1)
+    eye_mid = xy[:, EYE_OUTER].mean(axis=1)
+    eye_line = xy[:, EYE_OUTER[1]] - xy[:, EYE_OUTER[0]]
+    eye_center_x = eye[..., [0, 3], 0].mean(axis=2)
+    eye_width = _dist(eye[..., 0, :], eye[..., 3, :]) + eps
 
-            # Final 20 features: (You can replace extra zeros later with more AUs or tracking data)
-            features = [avg_ear, brow_drop, lip_tight, blink, emo_encoded] + [0]*15
+    return np.column_stack([
+        avg_ear,
+        brow_drop,
+        lip_tight,
+        ear[:, 0],
+        ear[:, 1],
+        np.abs(ear[:, 0] - ear[:, 1]),
+        mouth_open / (mouth_w + eps),
+        mouth_w / iod,
+        brow_raise[:, 0],
+        brow_raise[:, 1],
+        _dist(xy[:, BROW_IDX[0, 0]], xy[:, BROW_IDX[1, 0]]) / iod,
+        (xy[:, LIP_CORNERS_IDX, 1].mean(axis=1) - lip_center_y) / iod,
+        _dist(xy[:, NOSE_TIP], xy[:, CHIN]) / face_h,
+        (xy[:, NOSE_TIP, 0] - (xy[:, FACE_LEFT, 0] + xy[:, FACE_RIGHT, 0]) / 2) / face_w,
+        (xy[:, NOSE_TIP, 1] - eye_mid[:, 1]) / face_h,
+        np.arctan2(eye_line[:, 1], eye_line[:, 0]),
+        face_w / face_h,
+        ((xy[:, IRIS_IDX, 0] - eye_center_x) / eye_width).mean(axis=1),
+    ])
 
+def features_from_landmarks(frame, pts, blink_detector, emotion_stage=None):
+    """Build the 20-feature vector from one (478, 3) landmark array"""
+    with span('geometry'):
+        geometry = geometric_features(pts[None])[0]
+        blink = blink_detector.update(geometry[0])
+    with span('emotion'):
+        emotion = (emotion_stage or EmotionStage())(frame, pts)
+    features = np.empty(N_FEATURES)
+    features[:3] = geometry[:3]
+    features[3] = blink
+    features[4] = map_emotion(emotion)
+    features[N_BASE_FEATURES:] = geometry[3:]
+    return features
+
+def _detect_landmarks(frame, mesh):
+    with span('facemesh'):
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        result = mesh.process(rgb)
+    if not result.multi_face_landmarks:
+        return None
+    return landmarks_to_array(result.multi_face_landmarks[0].landmark)
+
+class RoiTracker:
+    """
+    Follows the face between frames of one sequence. Once a face was
+    found, FaceMesh only sees a size x size crop around where it was,
+    with a margin, instead of the full frame. FaceMesh scales faces
+    down to 192x192 internally, so the default crop loses nothing. The
+    landmarks are mapped back to full-frame coordinates, so features are
+    the same as on the full frame. When the crop loses the face, the full
+    frame is searched again.
+    """
+
+    def __init__(self, size=None, margin=None):
+        self.size = size or config.FACE_ROI_SIZE
+        self.margin = config.FACE_ROI_MARGIN if margin is None else margin
+        self.box = None  # (x0, y0, side) in pixels
+        self.landmarks = None  # of the last frame with a face
+        self.crops = 0
+        self.full_frames = 0
+
+    def region(self, frame):
+        """The tracked square of frame, or the whole frame when there is none"""
+        if self.box is None:
+            return frame
+        x0, y0, side = self.box
+        return frame[y0:y0 + side, x0:x0 + side]
+
+    def _follow(self, pts, w, h):
+        (x_min, y_min), (x_max, y_max) = pts[:, :2].min(axis=0), pts[:, :2].max(axis=0)
+        side = int(max((x_max - x_min) * w, (y_max - y_min) * h) * (1 + 2 * self.margin))
+        if side >= min(w, h):
+            # The face fills the frame, a crop would not save anything
+            self.box = None
+            return
+        cx, cy = (x_min + x_max) / 2 * w, (y_min + y_max) / 2 * h
+        # Shift the square inside the frame rather than clipping it
+        x0 = min(max(int(cx - side / 2), 0), w - side)
+        y0 = min(max(int(cy - side / 2), 0), h - side)
+        self.box = (x0, y0, side)
+
+    def detect(self, frame, mesh):
+        """(478, 3) landmarks in full-frame normalized coordinates, or None"""
+        h, w = frame.shape[:2]
+        if self.box is not None:
+            x0, y0, side = self.box
+            interpolation = cv2.INTER_AREA if side > self.size else cv2.INTER_LINEAR
+            crop = cv2.resize(self.region(frame), (self.size, self.size), interpolation=interpolation)
+            pts = _detect_landmarks(crop, mesh)
+            if pts is not None:
+                self.crops += 1
+                pts[:, 0] = (x0 + pts[:, 0] * side) / w
+                pts[:, 1] = (y0 + pts[:, 1] * side) / h
+                # z shares the scale of x
+                pts[:, 2] *= side / w
+                self._follow(pts, w, h)
+                self.landmarks = pts
+                return pts
+            self.box = None
+        self.full_frames += 1
+        pts = _detect_landmarks(frame, mesh)
+        if pts is not None:
+            self._follow(pts, w, h)
+        self.landmarks = pts
+        return pts
+
+def extract_features(frame, blink_detector, mesh=None, emotion_stage=None, roi=None):
+    """
+    Extract facial features from frame. Without a mesh, a static-image
+    FaceMesh is borrowed from the pool for this one frame.
+    """
+    return extract_features_batch([frame], blink_detector, mesh, emotion_stage, roi)[0]
+
+def extract_features_batch(frames, blink_detector=None, mesh=None, emotion_stage=None, roi=None):
+    """
+    Extract features for a sequence of frames into an (N, 20) matrix that
+    can go straight into scaler.transform and model.predict. Rows stay zero
+    where no face was found. With a blink_detector the frames are treated as
+    one sequence; without one every frame is counted on its own. A
+    RoiTracker (for sequences on a tracking mesh) limits FaceMesh to the
+    face region.
+    """
+    features = np.zeros((len(frames), N_FEATURES))
+    if mesh is None:
+        with mesh_pool.static() as static_mesh:
+            return _fill_features(features, frames, blink_detector, static_mesh, emotion_stage, roi)
+    return _fill_features(features, frames, blink_detector, mesh, emotion_stage, roi)
+
+def _fill_features(features, frames, blink_detector, mesh, emotion_stage, roi=None):
+    for i, frame in enumerate(frames):
+        pts = roi.detect(frame, mesh) if roi is not None else _detect_landmarks(frame, mesh)
+        if pts is None:
+            continue
+        try:
+            features[i] = features_from_landmarks(
+                frame, pts, blink_detector or BlinkDetector(), emotion_stage)
         except Exception as e:
             print("⛔ Feature extraction failed:", e)
-
-    return np.array(features)
+    return features
 
 # Load model and encoders once
+MODEL_PATH = "models/mental_state_faces_model2.keras"
+LABEL_ENCODER_PATH = "models/label_encoder.pkl"
+SCALER_PATH = "models/scaler.pkl"
+
 model = None
 label_encoder = None
 scaler = None
+# Pure-NumPy copy of the model with the scaler folded in, when the model
+# is a plain dense stack; it takes unscaled features
+fast_model = None
+FAST_MODEL_PATH = os.path.join(config.EXPORTED_MODELS_DIR, 'face.mlp.npz')
 
-def load_models():
-    """Load the trained model and encoders"""
-    global model, label_encoder, scaler
+def load_keras_model():
+    from tensorflow.keras.models import load_model
+    return load_model(MODEL_PATH)
+
+def _load_fast_model():
+    """
+    The NumPy fast path: from the saved .npz when it matches the current
+    model and scaler files (no TensorFlow needed), else extracted from the
+    Keras model and checked against it. None when the model does not qualify.
+    """
+    global model
+    version = model_version_of(MODEL_PATH, SCALER_PATH)
+    mlp = DenseMLP.load(FAST_MODEL_PATH, version)
+    if mlp is not None:
+        print("✅ Face model served by the NumPy fast path")
+        return mlp
+    if not os.path.exists(MODEL_PATH) or not hasattr(scaler, 'mean_'):
+        return None
+    
+    # Keep the Keras model, it is the fallback if the fast path is not usable
+    model = load_keras_model()
+    try:
+        mlp = DenseMLP.from_keras(model, scaler)
+    except NotADenseStack as e:
+        print(f"Face model has no NumPy fast path: {e}")
+        return None
     
-    if model is None:
-        model_path = "models/mental_state_faces_model2.keras"
-        label_encoder_path = "models/label_encoder.pkl"
-        scaler_path = "models/scaler.pkl"
+    sample = scaler.mean_ + scaler.scale_ * np.random.default_rng(0).standard_normal((64, N_FEATURES))
+    expected = model.predict(scaler.transform(sample), verbose=0)
+    if not np.allclose(mlp.predict(sample), expected, atol=1e-4):
+        print("⚠️ NumPy fast path does not match the face model, using Keras")
+        return None
+    try:
+        mlp.save(FAST_MODEL_PATH, version)
+    except OSError as e:
+        print(f"⚠️ Could not save the face fast path: {e}")
+    print("✅ Face model served by the NumPy fast path")
+    return mlp
+
+def _load_face_models():
+    """Load the trained model (on the configured inference backend) and encoders"""
+    global model, label_encoder, scaler, fast_model
+    
+    if model is None and fast_model is None:
+        model_path = MODEL_PATH
+        label_encoder_path = LABEL_ENCODER_PATH
+        scaler_path = SCALER_PATH
         
-        if not os.path.exists(model_path):
+        if not os.path.exists(model_path) and inference_backend.selected_path('face') is None:
             raise FileNotFoundError(f"Model file not found: {model_path}")
         
-        model = load_model(model_path)
-        
         # Try to load encoder files, but provide fallback if they don't exist
         try:
             if os.path.exists(label_encoder_path):
@@ -134,6 +423,85 @@ def load_models():
         except Exception as e:
             print(f"Error loading scaler: {e}")
             raise
+        
+        # An explicitly selected TFLite/ONNX backend takes precedence
+        if config.FACE_FAST_PATH and inference_backend.backend_for('face') == 'keras':
+            fast_model = _load_fast_model()
+        if fast_model is None and model is None:
+            model = inference_backend.load('face', load_keras_model)
+        elif fast_model is None:
+            # The Keras model _load_fast_model kept as the fallback
+            model = inference_backend.compiled('face', model)
+    return fast_model or model
+
+registry.register('face', _load_face_models)
+
+def load_models():
+    """Load the trained model and encoders (once, through the model registry)"""
+    registry.get('face')
+
+def model_version():
+    """Identifies the model files and settings behind a face result"""
+    return (inference_backend.model_version('face', MODEL_PATH)
+            + '|' + model_version_of(LABEL_ENCODER_PATH, SCALER_PATH)
+            + f"|extended={int(config.FACE_MODEL_EXTENDED_FEATURES)}")
+
+def _predict_batch(batch):
+    """Run the face model on a batch of scaled feature vectors"""
+    return model.predict(batch, verbose=0)
+
+def _model_input(features):
+    """
+    Feature matrix as the model expects it. The shipped model was trained
+    with the geometric slots zero-padded, so they are only passed through
+    when FACE_MODEL_EXTENDED_FEATURES is set for a retrained model.
+    """
+    features = np.atleast_2d(features)
+    if config.FACE_MODEL_EXTENDED_FEATURES:
+        return features
+    model_input = np.zeros_like(features)
+    model_input[:, :N_BASE_FEATURES] = features[:, :N_BASE_FEATURES]
+    return model_input
+
+def _classify(features):
+    """Scale one feature vector and classify it through the shared batcher"""
+    if fast_model is not None:
+        # Microseconds of NumPy, not worth waiting for a batch to fill
+        with span('face_predict'):
+            prediction = fast_model.predict(_model_input(features))[0]
+    else:
+        with span('scaler'):
+            features_scaled = scaler.transform(_model_input(features))[0]
+        prediction = predict_one('face', _predict_batch, features_scaled)
+    predicted_label = label_encoder.inverse_transform([np.argmax(prediction)])[0]
+    probabilities = {str(label): float(p) for label, p in zip(label_encoder.classes_, prediction)}
+    return predicted_label, float(np.max(prediction)), probabilities
+
+def classify_batch(features):
+    """
+    Classify an (N, 20) feature matrix in one forward pass.
+    Returns (labels, confidences).
+    """
+    load_models()
+    if fast_model is not None:
+        prediction = fast_model.predict(_model_input(features))
+    else:
+        prediction = _predict_batch(scaler.transform(_model_input(features)))
+    labels = label_encoder.inverse_transform(np.argmax(prediction, axis=1))
+    return list(labels), np.max(prediction, axis=1).astype(float)
+
+def feature_dict(features):
+    """JSON-friendly view of one feature vector"""
+    result = {
+        'eye_aspect_ratio': float(features[0]),
+        'brow_drop': float(features[1]),
+        'lip_tightness': float(features[2]),
+        'blink_count': int(features[3]),
+        'emotion_encoded': int(features[4])
+    }
+    for name, value in zip(GEOMETRIC_FEATURE_NAMES, features[N_BASE_FEATURES:]):
+        result[name] = float(value)
+    return result
 
 def predict_from_image(file):
     """
@@ -148,14 +516,32 @@ def predict_from_image(file):
             # If file is a path
             frame = cv2.imread(file)
         else:
-            # If file is a file object (e.g., from Flask upload)
-            file_bytes = file.read()
-            nparr = np.frombuffer(file_bytes, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            # If file is a file object (e.g., from Flask upload) or a buffer
+            file_bytes = as_buffer(file)
+            with span('imdecode'):
+                nparr = np.frombuffer(file_bytes, np.uint8)
+                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
         
         if frame is None:
             return {'error': 'Could not read image'}, 400
         
+        return predict_from_image_array(frame)
+        
+    except PoolExhausted as e:
+        return {'error': f'Face analysis is busy, try again later ({e})'}, 503
+    except ModelUnavailable as e:
+        return {'error': str(e)}, 503
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+def predict_from_image_array(frame):
+    """
+    Process an already decoded BGR image and return mental state prediction
+    """
+    try:
+        # Load models if not already loaded
+        load_models()
+        
         # Initialize blink detector
         blink_detector = BlinkDetector()
         
@@ -167,30 +553,143 @@ def predict_from_image(file):
             return {'error': 'No face detected or feature extraction failed'}, 400
         
         # Make prediction
-        features_scaled = scaler.transform([features])
-        prediction = model.predict(features_scaled, verbose=0)
-        predicted_label = label_encoder.inverse_transform([np.argmax(prediction)])[0]
-        confidence = float(np.max(prediction))
+        predicted_label, confidence, probabilities = _classify(features)
         
         # Return prediction results
         return {
             'mental_state': predicted_label,
             'confidence': confidence,
-            'features': {
-                'eye_aspect_ratio': float(features[0]),
-                'brow_drop': float(features[1]),
-                'lip_tightness': float(features[2]),
-                'blink_count': int(features[3]),
-                'emotion_encoded': int(features[4])
-            }
+            'probabilities': probabilities,
+            'features': feature_dict(features)
         }
         
+    except PoolExhausted as e:
+        return {'error': f'Face analysis is busy, try again later ({e})'}, 503
+    except ModelUnavailable as e:
+        return {'error': str(e)}, 503
     except Exception as e:
         return {'error': str(e)}, 500
 
-def predict_from_frame(frame):
+# Side of the thumbnails compared to spot frames that barely changed
+THUMBNAIL_SIZE = 32
+# Size (w, h) of the separate thumbnail of both eyes: a blink moves too
+# few pixels of the face thumbnail to be noticed there
+EYE_THUMBNAIL_SIZE = (32, 8)
+# Frames are not skipped while the last analyzed eye aspect ratio is this
+# close to EYE_AR_THRESH, or moved by more than EAR_SKIP_DELTA since the
+# analyzed frame before it: a blink may be under way
+EAR_SKIP_MARGIN = 0.05
+EAR_SKIP_DELTA = 0.02
+
+class FaceSession:
+    """
+    Per-client realtime state: a blink detector, a FaceMesh instance in
+    tracking mode, the tracked face region, the last result and a short
+    history of recent feature vectors
+    """
+
+    def __init__(self, history=30):
+        self.blink_detector = BlinkDetector()
+        self.face_mesh = mesh_pool.acquire_tracking()
+        self.emotion_stage = EmotionStage(config.FACE_EMOTION_EVERY_N)
+        self.roi = RoiTracker() if config.FACE_ROI_TRACKING else None
+        self.history = deque(maxlen=history)
+        self.started_at = time.time()
+        self.frames = 0
+        self.reused = 0
+        self.last_result = None
+        self._reference = None  # (thumbnail, region box, eye thumbnail) of the last analyzed frame
+        self._ears = deque(maxlen=2)  # eye aspect ratio of the last analyzed frames
+        self._skipped_in_row = 0
+
+    def _eye_thumbnail(self, frame):
+        """Both eyes, around where the last landmarks put them; None without landmarks"""
+        pts = self.roi.landmarks if self.roi is not None else None
+        if pts is None:
+            return None
+        h, w = frame.shape[:2]
+        eyes = pts[EYE_IDX.ravel(), :2] * (w, h)
+        (x0, y0), (x1, y1) = eyes.min(axis=0), eyes.max(axis=0)
+        pad = (y1 - y0) + 2
+        x0, y0 = max(int(x0 - pad), 0), max(int(y0 - pad), 0)
+        x1, y1 = min(int(x1 + pad) + 1, w), min(int(y1 + pad) + 1, h)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return cv2.resize(frame[y0:y1, x0:x1], EYE_THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def _thumbnail(self, frame):
+        region = self.roi.region(frame) if self.roi is not None else frame
+        thumb = cv2.resize(region, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA)
+        return thumb.astype(np.int16), self.roi.box if self.roi is not None else None, self._eye_thumbnail(frame)
+
+    def _eyes_moving(self):
+        """True while the analyzed frames suggest a blink may be under way"""
+        if self.blink_detector.eye_closed or not self._ears:
+            return True
+        if self._ears[-1] < EYE_AR_THRESH + EAR_SKIP_MARGIN:
+            return True
+        return len(self._ears) == 2 and abs(self._ears[1] - self._ears[0]) > EAR_SKIP_DELTA
+
+    def unchanged(self, frame):
+        """
+        True when frame barely differs from the last analyzed one, so its
+        result can be reused. The thumbnails cover the face region, where
+        a change of expression moves many pixels. Blinks are too small for
+        that, so the eyes are compared on their own thumbnail, and frames
+        are never skipped while the eyes are closed or closing: every frame
+        of a blink reaches the blink detector. A reused frame is never the
+        reference, so slow drift still adds up.
+        """
+        if (config.FACE_SKIP_DIFF_THRESHOLD <= 0 or self.last_result is None
+                or self._skipped_in_row >= config.FACE_SKIP_MAX or self._eyes_moving()):
+            return False
+        with span('frame_diff'):
+            thumb, box, eyes = self._thumbnail(frame)
+            reference, reference_box, reference_eyes = self._reference
+            threshold = config.FACE_SKIP_DIFF_THRESHOLD
+            same = (box == reference_box and eyes is not None and reference_eyes is not None
+                    and np.abs(thumb - reference).mean() < threshold
+                    and np.abs(eyes - reference_eyes).mean() < threshold)
+        if same:
+            self._skipped_in_row += 1
+            self.reused += 1
+        return same
+
+    def add(self, features):
+        self.frames += 1
+        self.history.append(features[:3].astype(float))
+
+    def analyzed(self, frame, result):
+        """Remember the result (and thumbnail) of a fully analyzed frame"""
+        self.last_result = dict(result)
+        self._ears.append(result['features']['eye_aspect_ratio'])
+        self._skipped_in_row = 0
+        if config.FACE_SKIP_DIFF_THRESHOLD > 0:
+            self._reference = self._thumbnail(frame)
+
+    def temporal_features(self):
+        """Smoothed features over the recent frames of this session"""
+        elapsed_min = max(time.time() - self.started_at, 1e-6) / 60.0
+        mean = np.mean(self.history, axis=0) if self.history else np.zeros(3)
+        return {
+            'frames': self.frames,
+            'reused_frames': self.reused,
+            'blink_rate_per_min': self.blink_detector.blink_counter / elapsed_min,
+            'mean_eye_aspect_ratio': float(mean[0]),
+            'mean_brow_drop': float(mean[1]),
+            'mean_lip_tightness': float(mean[2])
+        }
+
+    def close(self):
+        if self.face_mesh is not None:
+            mesh_pool.release_tracking(self.face_mesh)
+            self.face_mesh = None
+
+def predict_from_frame(frame, session=None):
     """
-    Process a single frame (numpy array) and return mental state prediction
+    Process a single frame (numpy array) and return mental state prediction.
+    When a FaceSession is given, blink counting and landmark tracking carry
+    over from the previous frames of that session.
     """
     try:
         # Load models if not already loaded
@@ -199,34 +698,48 @@ def predict_from_frame(frame):
         if frame is None:
             return {'error': 'Invalid frame'}, 400
         
-        # Initialize blink detector
-        blink_detector = BlinkDetector()
+        if session is not None:
+            if session.unchanged(frame):
+                # Nearly the same picture as the last analyzed frame
+                result = dict(session.last_result, reused=True)
+                result['session'] = session.temporal_features()
+                return result
+            blink_detector = session.blink_detector
+            mesh = session.face_mesh
+            emotion_stage = session.emotion_stage
+            roi = session.roi
+        else:
+            blink_detector = BlinkDetector()
+            mesh = None
+            emotion_stage = None
+            roi = None
         
         # Extract features
-        features = extract_features(frame, blink_detector)
+        features = extract_features(frame, blink_detector, mesh, emotion_stage, roi)
         
         # Check if features were extracted successfully
         if np.all(features == 0):
             return {'error': 'No face detected or feature extraction failed'}, 400
         
         # Make prediction
-        features_scaled = scaler.transform([features])
-        prediction = model.predict(features_scaled, verbose=0)
-        predicted_label = label_encoder.inverse_transform([np.argmax(prediction)])[0]
-        confidence = float(np.max(prediction))
+        predicted_label, confidence, probabilities = _classify(features)
         
         # Return prediction results
-        return {
+        result = {
             'mental_state': predicted_label,
             'confidence': confidence,
-            'features': {
-                'eye_aspect_ratio': float(features[0]),
-                'brow_drop': float(features[1]),
-                'lip_tightness': float(features[2]),
-                'blink_count': int(features[3]),
-                'emotion_encoded': int(features[4])
-            }
+            'probabilities': probabilities,
+            'features': feature_dict(features)
         }
+        if session is not None:
+            session.add(features)
+            session.analyzed(frame, result)
+            result['session'] = session.temporal_features()
+        return result
         
+    except PoolExhausted as e:
+        return {'error': f'Face analysis is busy, try again later ({e})'}, 503
+    except ModelUnavailable as e:
+        return {'error': str(e)}, 503
     except Exception as e:
         return {'error': str(e)}, 500 
\ No newline at end of file
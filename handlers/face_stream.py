@@ -0,0 +1,113 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import config
+from handlers.face_handler import FaceSession, predict_from_frame
+from utils import metrics
+from utils.admission import DeadlineExceeded, Rejected
+
+
+class FaceStream:
+    """
+    Realtime face analysis for one socket client.
+
+    Frames arrive as raw JPEG/PNG bytes and are kept in a single-slot
+    buffer: if a new frame arrives before the previous one was picked up,
+    the older one is dropped so the client always gets results for its
+    most recent frame. A background loop decodes and infers the latest
+    frame and pushes the result back through the emit callback. A frame
+    that waited longer than deadline_ms is stale and dropped unprocessed.
+
+    Inference goes through compute(fn, *args, deadline=...), the app's
+    compute executor, so socket frames share its thread and queue limits
+    with HTTP requests. A frame the executor refuses or cannot start
+    before its deadline gets a dropped-frame reply.
+    """
+
+    def __init__(self, emit, deadline_ms=None, compute=None):
+        self.emit = emit
+        self.compute = compute or (lambda fn, *args, deadline=None: fn(*args))
+        self.deadline = (deadline_ms or config.REALTIME_FRAME_DEADLINE_MS) / 1000.0
+        self.session = FaceSession()
+        self._cond = threading.Condition()
+        self._pending = None
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+        self.expired = 0
+        self.processed = 0
+
+    def push(self, data, frame_id=None):
+        """Queue the newest frame, replacing any frame not yet processed"""
+        with self._cond:
+            self.received += 1
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = (data, frame_id, time.time())
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._pending = None
+            self._cond.notify()
+
+    def _next_frame(self):
+        with self._cond:
+            while self._pending is None and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return None
+            pending, self._pending = self._pending, None
+            return pending
+
+    def run(self):
+        """Process frames until the stream is closed"""
+        try:
+            while True:
+                pending = self._next_frame()
+                if pending is None:
+                    break
+                if time.time() - pending[2] > self.deadline:
+                    self.dropped += 1
+                    self.expired += 1
+                    continue
+                self.emit('face_result', self._process(*pending))
+        finally:
+            self.session.close()
+
+    def _process(self, data, frame_id, received_at):
+        trace = metrics.start_trace('socket:/face/frame')
+        status = 200
+        try:
+            frame = None
+            if data:
+                with metrics.span('imdecode'):
+                    frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                result, status = {'error': 'Invalid frame data'}, 400
+            else:
+                # The deadline counts from arrival, on the executor's monotonic clock
+                deadline = time.monotonic() + self.deadline - (time.time() - received_at)
+                result = self.compute(predict_from_frame, frame, self.session, deadline=deadline)
+                if isinstance(result, tuple):
+                    result, status = result
+        except (Rejected, DeadlineExceeded) as e:
+            self.dropped += 1
+            if isinstance(e, DeadlineExceeded):
+                self.expired += 1
+            result, status = {'error': f'Dropped: {e}', 'dropped': True}, 503
+        except Exception as e:
+            print(f"Error processing stream frame: {e}")
+            result, status = {'error': str(e)}, 500
+        self.processed += 1
+        # Frames are counted in the metrics but, at camera rates, not logged
+        metrics.finish_trace(trace, status, log=False)
+
+        result['frame_id'] = frame_id
+        result['latency_ms'] = (time.time() - received_at) * 1000.0
+        result['dropped_frames'] = self.dropped
+        return result
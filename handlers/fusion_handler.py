@@ -0,0 +1,91 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from handlers.batch_handler import _analyze_one
+from utils import metrics
+
+MODALITIES = ('handwriting', 'voice', 'face')
+
+
+def parse_weights(spec):
+    """Parse 'handwriting:1,voice:2,face:1' into {'handwriting': 1.0, ...}"""
+    weights = {}
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        name, _, weight = part.partition(':')
+        name = name.strip()
+        if name not in MODALITIES:
+            raise ValueError(f"Unknown modality in FUSION_WEIGHTS: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def _distribution(result):
+    """Class probabilities of one modality result"""
+    probabilities = result.get('probabilities')
+    if probabilities:
+        return probabilities
+    # Results without a distribution (mock models, old cache entries) vote
+    # for their top class with their confidence
+    label = result.get('emotion', result.get('mental_state'))
+    return {label: float(result.get('confidence', 0.0))}
+
+
+def fuse(results, weights=None):
+    """
+    Late fusion of successful modality results: the weighted mean of their
+    class probabilities. Modalities predict different class sets (face
+    adds 'Normal'); a class a modality does not predict counts as 0 for it.
+    Returns None when no modality succeeded.
+    """
+    weights = weights or {}
+    used = {name: weights.get(name, 1.0) for name in results if weights.get(name, 1.0) > 0}
+    total = sum(used.values())
+    if not total:
+        return None
+
+    fused = {}
+    for name, weight in used.items():
+        for label, p in _distribution(results[name]).items():
+            fused[label] = fused.get(label, 0.0) + weight * p / total
+    state = max(fused, key=fused.get)
+    top = {name: max(_distribution(results[name]).items(), key=lambda item: item[1])[0] for name in used}
+    return {
+        'state': state,
+        'confidence': fused[state],
+        'probabilities': fused,
+        'weights': {name: weight / total for name, weight in used.items()},
+        # Share of the fused weight whose own top class agrees with the fused state
+        'agreement': sum(used[name] for name, label in top.items() if label == state) / total
+    }
+
+
+def run_assessment(inputs, analyzers, weights=None):
+    """
+    Analyze every given modality concurrently and fuse the results.
+
+    inputs maps a modality to its upload bytes and analyzers maps it to the
+    analyze function of its single-modality endpoint, so results (and the
+    result cache) are shared with those endpoints. The request waits for
+    the slowest modality only. A failing modality is reported with its
+    status and left out of the fusion.
+    """
+    started = time.perf_counter()
+    trace = metrics.current_trace()
+    with ThreadPoolExecutor(max_workers=len(inputs)) as executor:
+        futures = {
+            name: executor.submit(_analyze_one, analyzers[name], data, trace)
+            for name, data in inputs.items()
+        }
+        modalities = {}
+        for name, future in futures.items():
+            result, status = future.result()
+            modalities[name] = {'status': status, 'result': result}
+
+    succeeded = {name: m['result'] for name, m in modalities.items() if m['status'] == 200}
+    with metrics.span('fusion'):
+        fused = fuse(succeeded, weights)
+    return {
+        'modalities': modalities,
+        'fused': fused,
+        'elapsed_ms': (time.perf_counter() - started) * 1000.0
+    }
@@ -1,55 +1,119 @@
 import cv2
 import numpy as np
-from tensorflow.keras.models import load_model
-from tensorflow.keras.losses import MeanSquaredError
-from tensorflow.keras.metrics import MeanSquaredError as MSEMetric
 from utils.image_utils import preprocess_image
+from utils.batching import predict_one
+from utils.model_registry import registry, ModelUnavailable
+from utils import inference_backend
+from utils.metrics import span
 import json
 import os
+import threading
 
-# Load model with custom objects and handle compatibility issues
-custom_objects = {
-    'mse': MeanSquaredError(),
-    'mean_squared_error': MeanSquaredError(),
-    'MSE': MSEMetric()
-}
+MODEL_PATHS = ['models/emothaw_cnn_model.h5', 'models/emothaw_cnn_model.keras']
 
-# Load model once with compatibility handling
 model = None
-try:
-    # Try loading with compile=False first
-    model = load_model('models/emothaw_cnn_model.h5', custom_objects=custom_objects, compile=False)
-    print("✅ Handwriting model loaded successfully!")
-except Exception as e1:
-    print(f"⚠️ First attempt failed: {e1}")
+
+def load_keras_model():
+    """Load the Keras model with compatibility handling, falling back to a mock"""
+    from tensorflow.keras.models import load_model
+    from tensorflow.keras.losses import MeanSquaredError
+    from tensorflow.keras.metrics import MeanSquaredError as MSEMetric
+    
+    # Load model with custom objects and handle compatibility issues
+    custom_objects = {
+        'mse': MeanSquaredError(),
+        'mean_squared_error': MeanSquaredError(),
+        'MSE': MSEMetric()
+    }
+    
     try:
-        # Try loading without custom objects
-        model = load_model('models/emothaw_cnn_model.keras', compile=False)
-        print("✅ Handwriting model loaded successfully (without custom objects)!")
-    except Exception as e2:
-        print(f"⚠️ Second attempt failed: {e2}")
+        # Try loading with compile=False first
+        model = load_model('models/emothaw_cnn_model.h5', custom_objects=custom_objects, compile=False)
+        print("✅ Handwriting model loaded successfully!")
+    except Exception as e1:
+        print(f"⚠️ First attempt failed: {e1}")
         try:
-            # Try loading with safe_mode
-            model = load_model('models/emothaw_cnn_model.keras', compile=False, safe_mode=True)
-            print("✅ Handwriting model loaded successfully (with safe_mode)!")
-        except Exception as e3:
-            print(f"❌ All attempts failed: {e3}")
-            print("⚠️ Using mock model for testing purposes")
-            model = "mock"  # Use mock model for testing
+            # Try loading without custom objects
+            model = load_model('models/emothaw_cnn_model.keras', compile=False)
+            print("✅ Handwriting model loaded successfully (without custom objects)!")
+        except Exception as e2:
+            print(f"⚠️ Second attempt failed: {e2}")
+            try:
+                # Try loading with safe_mode
+                model = load_model('models/emothaw_cnn_model.keras', compile=False, safe_mode=True)
+                print("✅ Handwriting model loaded successfully (with safe_mode)!")
+            except Exception as e3:
+                print(f"❌ All attempts failed: {e3}")
+                print("⚠️ Using mock model for testing purposes")
+                model = "mock"  # Use mock model for testing
+    return model
+
+def _load_handwriting_model():
+    """The model on the configured inference backend"""
+    global model
+    model = inference_backend.load('handwriting', load_keras_model)
+    return model
+
+registry.register('handwriting', _load_handwriting_model)
+
+def load_handwriting_model():
+    """The handwriting model (or "mock"), loaded once through the model registry"""
+    return registry.get('handwriting')
+
+# One reusable input buffer per request thread; predict_one blocks until the
+# batch containing it has run, so it is free again before the next request
+_buffers = threading.local()
+
+def _input_buffer():
+    if not hasattr(_buffers, 'image'):
+        _buffers.image = np.empty((224, 224, 1), dtype='float32')
+    return _buffers.image
+
+def model_version():
+    """
+    Identifies the model behind a result; None when results must not be
+    cached. Works before the model has loaded, from the model files.
+    """
+    if model == "mock":
+        # Mock predictions are random
+        return None
+    paths = [path for path in MODEL_PATHS if os.path.exists(path)]
+    if not paths and inference_backend.selected_path('handwriting') is None:
+        return None
+    return inference_backend.model_version('handwriting', *paths)
+
+def _predict_batch(batch):
+    """Run the handwriting model on a batch of preprocessed images"""
+    return model.predict(batch, verbose=0)
 
 def predict_from_image(file):
     """
     Process handwriting image and return emotion prediction
     """
     try:
-        if model is None:
-            return {'error': 'Model not loaded'}, 500
+        load_handwriting_model()
+        
+        # Read and preprocess the image
+        with span('preprocess'):
+            image = preprocess_image(file, out=_input_buffer())
+        
+        return predict_from_tensor(image)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except ModelUnavailable as e:
+        return {'error': str(e)}, 503
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+def predict_from_tensor(image):
+    """
+    Return emotion prediction for an already preprocessed (224, 224, 1) image
+    """
+    try:
+        load_handwriting_model()
         
         # If using mock model, return a test prediction
         if model == "mock":
-            # Read and preprocess the image to ensure the pipeline works
-            image = preprocess_image(file)
-            
             # Return a mock prediction for testing
             import random
             emotions = ['Depression', 'Anxiety', 'Stress']
@@ -58,14 +122,12 @@ def predict_from_image(file):
             
             return {
                 'emotion': emotion,
-                'confidence': confidence
+                'confidence': confidence,
+                'mock': True
             }
-            
-        # Read and preprocess the image
-        image = preprocess_image(file)
         
         # Make prediction
-        prediction = model.predict(np.expand_dims(image, axis=0), verbose=0)[0]
+        prediction = predict_one('handwriting', _predict_batch, image)
         
         # Define emotion classes
         classes = ['Depression', 'Anxiety', 'Stress']
@@ -73,7 +135,10 @@ def predict_from_image(file):
         # Return prediction results
         return {
             'emotion': classes[np.argmax(prediction)],
-            'confidence': float(np.max(prediction))
+            'confidence': float(np.max(prediction)),
+            'probabilities': {label: float(p) for label, p in zip(classes, prediction)}
         }
+    except ModelUnavailable as e:
+        return {'error': str(e)}, 503
     except Exception as e:
         return {'error': str(e)}, 500 
\ No newline at end of file
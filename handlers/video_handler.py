@@ -0,0 +1,267 @@
+import math
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+import config
+from handlers.face_handler import FaceSession, classify_batch, extract_features, load_models
+from utils import metrics
+from utils.face_mesh_pool import PoolExhausted
+from utils.model_registry import ModelUnavailable
+
+# End-of-stream marker passed down the pipeline queues
+_DONE = object()
+
+
+class VideoError(Exception):
+    """The upload cannot be read as a video"""
+
+
+def _put(q, item, stop):
+    """Block while the queue is full (backpressure) unless the pipeline is stopping"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+class VideoPipeline:
+    """
+    Face analysis of one video file as three overlapping stages:
+
+    1. decode (background thread): read frames and pass on one per
+       sampling interval,
+    2. features (background thread): MediaPipe in tracking mode, one
+       BlinkDetector and the emotion stage of a FaceSession, frame by frame
+       in video order,
+    3. inference (calling thread): the face model on batches of feature
+       vectors.
+
+    Stages are joined by bounded queues, so a slow stage holds back the
+    ones before it instead of frames piling up in memory.
+    """
+
+    def __init__(self, path, sample_fps=None, batch_size=None, queue_size=None):
+        self.path = path
+        self.sample_fps = sample_fps or config.VIDEO_SAMPLE_FPS
+        self.batch_size = batch_size or config.VIDEO_BATCH_SIZE
+        self.queue_size = queue_size or config.VIDEO_QUEUE_SIZE
+        self.fps = None
+        self.frames_decoded = 0
+        self._stop = threading.Event()
+        self._errors = []
+
+    def _decode(self, capture, frames_out, trace):
+        interval = 1.0 / self.sample_fps
+        next_sample = 0.0
+        try:
+            with metrics.use_trace(trace):
+                while not self._stop.is_set():
+                    # grab() still decodes every frame (codecs need them),
+                    # but skipped frames never get converted and copied out
+                    with metrics.span('video_decode'):
+                        if not capture.grab():
+                            break
+                    t = self.frames_decoded / self.fps
+                    self.frames_decoded += 1
+                    if t + 1e-9 < next_sample:
+                        continue
+                    ok, frame = capture.retrieve()
+                    if not ok:
+                        continue
+                    next_sample = (math.floor(t / interval + 1e-9) + 1) * interval
+                    if not _put(frames_out, (t, frame), self._stop):
+                        break
+        except Exception as e:
+            self._errors.append(e)
+        finally:
+            _put(frames_out, _DONE, self._stop)
+
+    def _extract(self, session, frames_in, features_out, trace):
+        try:
+            with metrics.use_trace(trace):
+                while True:
+                    item = _get(frames_in, self._stop)
+                    if item is _DONE:
+                        break
+                    t, frame = item
+                    features = extract_features(frame, session.blink_detector, session.face_mesh,
+                                                session.emotion_stage, session.roi)
+                    if not _put(features_out, (t, features), self._stop):
+                        break
+        except Exception as e:
+            self._errors.append(e)
+        finally:
+            _put(features_out, _DONE, self._stop)
+
+    def _classify(self, times, rows, samples):
+        with metrics.span('face_predict'):
+            labels, confidences = classify_batch(np.array(rows))
+        for t, features, label, confidence in zip(times, rows, labels, confidences):
+            samples.append((t, features, str(label), float(confidence)))
+        times.clear()
+        rows.clear()
+
+    def run(self):
+        """
+        Run the pipeline over the whole video. Returns (samples, no_face
+        times): one (time, features, label, confidence) per sampled frame
+        with a face, in video order.
+        """
+        capture = cv2.VideoCapture(self.path)
+        if not capture.isOpened():
+            raise VideoError("Could not open the video")
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        # Some containers report 0 or NaN; the sampling stride needs a real rate
+        self.fps = fps if math.isfinite(fps) and fps > 0 else 30.0
+
+        try:
+            session = FaceSession()
+        except Exception:
+            capture.release()
+            raise
+        frames = queue.Queue(maxsize=self.queue_size)
+        features = queue.Queue(maxsize=self.queue_size)
+        trace = metrics.current_trace()
+        threads = [
+            threading.Thread(target=self._decode, args=(capture, frames, trace), daemon=True),
+            threading.Thread(target=self._extract, args=(session, frames, features, trace), daemon=True),
+        ]
+        samples, no_face = [], []
+        times, rows = [], []
+        try:
+            for thread in threads:
+                thread.start()
+            while True:
+                item = _get(features, self._stop)
+                if item is _DONE:
+                    break
+                t, row = item
+                if np.all(row == 0):
+                    no_face.append(t)
+                    continue
+                times.append(t)
+                rows.append(row)
+                if len(rows) >= self.batch_size:
+                    self._classify(times, rows, samples)
+            if rows:
+                self._classify(times, rows, samples)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            capture.release()
+            session.close()
+        if self._errors:
+            raise self._errors[0]
+        return samples, no_face
+
+
+def _top_state(labels, confidences):
+    """Label with the largest summed confidence, and its mean confidence"""
+    totals, counts = {}, {}
+    for label, confidence in zip(labels, confidences):
+        totals[label] = totals.get(label, 0.0) + confidence
+        counts[label] = counts.get(label, 0) + 1
+    state = max(totals, key=totals.get)
+    return state, totals[state] / counts[state]
+
+
+def _summary(samples):
+    """Mental state and smoothed features of a run of face samples"""
+    labels = [label for _, _, label, _ in samples]
+    confidences = [confidence for _, _, _, confidence in samples]
+    state, confidence = _top_state(labels, confidences)
+    mean = np.mean([features[:3] for _, features, _, _ in samples], axis=0)
+    return {
+        'mental_state': state,
+        'confidence': confidence,
+        'mean_eye_aspect_ratio': float(mean[0]),
+        'mean_brow_drop': float(mean[1]),
+        'mean_lip_tightness': float(mean[2])
+    }
+
+
+def build_report(samples, no_face, duration, segment_seconds):
+    """Per-segment timeline and whole-video aggregate of the pipeline output"""
+    segments = []
+    n_segments = max(1, math.ceil(duration / segment_seconds))
+    blinks_before = 0
+    for i in range(n_segments):
+        start, end = i * segment_seconds, min((i + 1) * segment_seconds, duration)
+        in_segment = [s for s in samples if start <= s[0] < end]
+        missed = sum(1 for t in no_face if start <= t < end)
+        segment = {
+            'start_seconds': start,
+            'end_seconds': end,
+            'frames': len(in_segment) + missed,
+            'face_frames': len(in_segment),
+            'mental_state': None,
+            'blinks': 0
+        }
+        if in_segment:
+            # blink_count is cumulative over the video
+            blinks = int(in_segment[-1][1][3])
+            segment.update(_summary(in_segment), blinks=blinks - blinks_before)
+            blinks_before = blinks
+        segments.append(segment)
+
+    blink_count = int(samples[-1][1][3])
+    labels = [label for _, _, label, _ in samples]
+    aggregate = {
+        'duration_seconds': duration,
+        'frames_sampled': len(samples) + len(no_face),
+        'face_frames': len(samples),
+        'blink_count': blink_count,
+        'blink_rate_per_min': blink_count / max(duration / 60.0, 1e-6),
+        # Share of face frames classified as each state
+        'state_share': {label: labels.count(label) / len(labels) for label in sorted(set(labels))},
+        **_summary(samples)
+    }
+    return {'timeline': segments, 'aggregate': aggregate}
+
+
+def analyze_video(path, sample_fps=None, segment_seconds=None):
+    """
+    Analyze a video file: a per-segment timeline of mental state, blinks
+    and smoothed features, plus the aggregate over the whole video
+    """
+    segment_seconds = segment_seconds or config.VIDEO_SEGMENT_SECONDS
+    try:
+        load_models()
+        pipeline = VideoPipeline(path, sample_fps=sample_fps)
+        samples, no_face = pipeline.run()
+        duration = pipeline.frames_decoded / pipeline.fps
+        if not samples:
+            return {
+                'error': 'No face detected in the video',
+                'duration_seconds': duration,
+                'frames_sampled': len(no_face)
+            }, 400
+        report = build_report(samples, no_face, duration, segment_seconds)
+        report['aggregate']['frames_decoded'] = pipeline.frames_decoded
+        report['sample_fps'] = pipeline.sample_fps
+        report['segment_seconds'] = segment_seconds
+        return report
+    except VideoError as e:
+        return {'error': str(e)}, 400
+    except PoolExhausted as e:
+        return {'error': f'Face analysis is busy, try again later ({e})'}, 503
+    except ModelUnavailable as e:
+        return {'error': str(e)}, 503
+    except Exception as e:
+        return {'error': str(e)}, 500
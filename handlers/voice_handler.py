@@ -1,26 +1,104 @@
 import numpy as np
-from tensorflow.keras.models import load_model
-from utils.audio_utils import extract_audio_features
+from utils.audio_utils import (
+    HOP_LENGTH,
+    audio_duration,
+    extract_audio_features,
+    iter_feature_windows,
+)
+from utils.batching import predict_one
+from utils import inference_backend
+from utils.compiled_predict import CompiledModel
+from utils.metrics import span
+from utils.model_registry import registry, ModelUnavailable
+import config
+
+# Define emotion classes
+CLASSES = ['Depression', 'Anxiety', 'Stress']
+SAMPLE_RATE = 22050
+
+MODEL_PATH = 'models/cnn_bilstm_dass_voice_model.h5'
 
 # Global model variable for lazy loading
 model = None
 
-def load_voice_model():
-    """Load the voice model lazily"""
+def load_keras_model():
+    from tensorflow.keras.models import load_model
+    return load_model(MODEL_PATH)
+
+def _length_buckets():
+    """Time lengths variable-length features are padded up to, ascending"""
+    return sorted({int(n) for n in config.VOICE_LENGTH_BUCKETS.split(',') if n.strip()})
+
+def _load_voice_model():
     global model
-    if model is None:
-        try:
-            model = load_model('models/cnn_bilstm_dass_voice_model.h5')
-            print("✅ Voice model loaded successfully!")
-        except Exception as e:
-            print(f"⚠️ Warning: Could not load voice model: {e}")
-            print("Voice analysis will not be available.")
-            model = None
+    # Compiled for any length, plus static shapes for every bucket and the
+    # streaming window length
+    lengths = _length_buckets() + [config.VOICE_WINDOW_FRAMES]
+    model = inference_backend.load('voice', load_keras_model, lengths=lengths)
+    print("✅ Voice model loaded successfully!")
     return model
 
-def predict_from_audio(file):
+registry.register('voice', _load_voice_model)
+
+def load_voice_model():
+    """Load the voice model lazily (once, through the model registry)"""
+    try:
+        return registry.get('voice')
+    except ModelUnavailable:
+        # The registry already logged why; voice analysis is not available
+        return None
+
+def model_version():
+    """Identifies the model and windowing settings behind a voice result"""
+    return (inference_backend.model_version('voice', MODEL_PATH)
+            + f"|stream>{config.VOICE_STREAM_MIN_SECONDS}"
+            + f"|window={config.VOICE_WINDOW_FRAMES}/{config.VOICE_WINDOW_STRIDE_FRAMES}"
+            + f"|buckets={config.VOICE_LENGTH_BUCKETS}")
+
+def _predict_batch(batch):
+    """Run the voice model on a batch of feature matrices"""
+    return model.predict(batch, verbose=0)
+
+def _model_frames(voice_model):
+    """Fixed time length of the model input, or None if it accepts any length"""
+    shape = voice_model.input_shape
+    return shape[2] if len(shape) == 3 else None
+
+def _fit_length(features, n_frames):
+    """Zero-pad or trim the time axis to the model's fixed input length"""
+    if n_frames is None or features.shape[1] == n_frames:
+        return features
+    if features.shape[1] > n_frames:
+        return features[:, :n_frames]
+    return np.pad(features, ((0, 0), (0, n_frames - features.shape[1])))
+
+def _bucket(features, voice_model):
+    """
+    Fit the time axis to the model's fixed input length. On a compiled
+    model that accepts any length, with VOICE_LENGTH_BUCKETS set, zero-pad
+    it up to the next bucket instead (inputs longer than the largest bucket
+    to a multiple of it); lengths it was compiled for are kept as they are.
+    """
+    n_frames = _model_frames(voice_model)
+    buckets = _length_buckets()
+    if n_frames is not None or not buckets or not isinstance(voice_model, CompiledModel):
+        return _fit_length(features, n_frames)
+    length = features.shape[1]
+    if length in buckets or length == config.VOICE_WINDOW_FRAMES:
+        return features
+    target = next((n for n in buckets if n >= length), None)
+    if target is None:
+        target = -(-length // buckets[-1]) * buckets[-1]
+    return _fit_length(features, target)
+
+def _probabilities(prediction):
+    return {label: float(p) for label, p in zip(CLASSES, prediction)}
+
+def predict_from_audio(file, streaming=None):
     """
-    Process audio file and return emotion prediction
+    Process audio file and return emotion prediction.
+    Long recordings (or streaming=True) go through the windowed streaming
+    path so memory does not grow with clip length.
     """
     try:
         # Load model if not already loaded
@@ -28,19 +106,63 @@ def predict_from_audio(file):
         if voice_model is None:
             return {'error': 'Voice model not available - compatibility issue'}, 503
         
+        if streaming is None:
+            duration = audio_duration(file)
+            streaming = duration is not None and duration > config.VOICE_STREAM_MIN_SECONDS
+        if streaming:
+            return predict_from_audio_stream(file)
+        
         # Extract audio features
-        features = extract_audio_features(file)
+        with span('audio_features'):
+            features = extract_audio_features(file)
         
         # Make prediction
-        prediction = voice_model.predict(np.expand_dims(features, axis=0))[0]
-        
-        # Define emotion classes
-        classes = ['Depression', 'Anxiety', 'Stress']
+        prediction = predict_one('voice', _predict_batch, _bucket(features, voice_model))
         
         # Return prediction results
         return {
-            'emotion': classes[np.argmax(prediction)],
-            'confidence': float(np.max(prediction))
+            'emotion': CLASSES[np.argmax(prediction)],
+            'confidence': float(np.max(prediction)),
+            'probabilities': _probabilities(prediction)
+        }
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+def predict_from_audio_stream(file):
+    """
+    Decode and featurize the recording block by block, run the model on
+    fixed-length windows and average the per-window probabilities
+    """
+    try:
+        voice_model = load_voice_model()
+        if voice_model is None:
+            return {'error': 'Voice model not available - compatibility issue'}, 503
+        
+        model_frames = _model_frames(voice_model)
+        window_frames = model_frames or config.VOICE_WINDOW_FRAMES
+        stride_frames = config.VOICE_WINDOW_STRIDE_FRAMES or window_frames
+        
+        total = np.zeros(len(CLASSES))
+        windows = []
+        for start, features in iter_feature_windows(file, window_frames, stride_frames, sr=SAMPLE_RATE):
+            # Clips shorter than one window give one shorter window
+            prediction = predict_one('voice', _predict_batch, _bucket(features, voice_model))
+            total += prediction
+            windows.append({
+                'start_seconds': start * HOP_LENGTH / SAMPLE_RATE,
+                'emotion': CLASSES[np.argmax(prediction)],
+                'confidence': float(np.max(prediction))
+            })
+        
+        if not windows:
+            return {'error': 'Audio is too short to analyze'}, 400
+        
+        mean = total / len(windows)
+        return {
+            'emotion': CLASSES[np.argmax(mean)],
+            'confidence': float(np.max(mean)),
+            'probabilities': _probabilities(mean),
+            'windows': windows
         }
     except Exception as e:
-        return {'error': str(e)}, 500 
\ No newline at end of file
+        return {'error': str(e)}, 500
@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+import config
+from handlers.voice_handler import (
+    CLASSES,
+    SAMPLE_RATE,
+    _fit_length,
+    _model_frames,
+    _predict_batch,
+    _probabilities,
+    load_voice_model,
+)
+from utils import metrics
+from utils.audio_utils import HOP_LENGTH, StreamingFeatures
+from utils.batching import predict_one
+from utils.model_registry import ModelUnavailable
+
+# PCM sample formats: numpy dtype and the scale to [-1, 1] floats
+PCM_FORMATS = {
+    'int16': (np.dtype('<i2'), 1.0 / 32768.0),
+    'float32': (np.dtype('<f4'), 1.0),
+}
+
+
+class VoiceStream:
+    """
+    Live voice analysis for one socket client.
+
+    The client sends raw PCM chunks. A background loop resamples them,
+    runs the feature front-end on the new samples only, and every
+    stride_frames STFT frames runs the voice model on the last
+    window_frames frames. Predictions are smoothed with an exponential
+    moving average and pushed back through the emit callback.
+
+    Memory is constant for the whole session: mel-dB frames live in a
+    ring of window + stride frames, and unprocessed audio is capped at
+    VOICE_STREAM_MAX_PENDING_SECONDS (chunks beyond that are dropped). If
+    the model falls behind, the due windows are coalesced and only the
+    newest one is inferred.
+    """
+
+    def __init__(self, emit, sample_rate=16000, channels=1, sample_format='int16'):
+        if sample_format not in PCM_FORMATS:
+            raise ValueError(f"Unknown PCM format: {sample_format} (use {', '.join(PCM_FORMATS)})")
+        if sample_rate <= 0 or channels <= 0:
+            raise ValueError("sample_rate and channels must be positive")
+        voice_model = load_voice_model()
+        if voice_model is None:
+            raise ModelUnavailable("Voice model not available")
+
+        self.emit = emit
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.dtype, self.scale = PCM_FORMATS[sample_format]
+        self.frame_bytes = self.dtype.itemsize * channels
+        self.model_frames = _model_frames(voice_model)
+        self.window_frames = self.model_frames or config.VOICE_WINDOW_FRAMES
+        self.stride_frames = config.VOICE_STREAM_STRIDE_FRAMES or self.window_frames
+        self.features = StreamingFeatures(self.window_frames, capacity=self.window_frames + self.stride_frames,
+                                          sr=SAMPLE_RATE)
+        self.resampler = None
+        if sample_rate != SAMPLE_RATE:
+            import soxr
+            self.resampler = soxr.ResampleStream(sample_rate, SAMPLE_RATE, 1, dtype='float32')
+
+        self._cond = threading.Condition()
+        self._pending = deque()
+        self._pending_bytes = 0
+        self._max_pending_bytes = int(config.VOICE_STREAM_MAX_PENDING_SECONDS * sample_rate) * self.frame_bytes
+        self._carry = b''
+        self._closed = False
+        self._next_end = self.window_frames  # end frame of the next window
+        self.smoothed = None
+        self.received_seconds = 0.0
+        self.dropped_chunks = 0
+        self.windows = 0
+        self.skipped_windows = 0
+
+    def push(self, chunk):
+        """Queue one PCM chunk; False when it was dropped because the backlog is full"""
+        if not chunk:
+            return True
+        with self._cond:
+            if self._pending_bytes + len(chunk) > self._max_pending_bytes:
+                self.dropped_chunks += 1
+                return False
+            self._pending.append((bytes(chunk), time.time()))
+            self._pending_bytes += len(chunk)
+            self.received_seconds += len(chunk) / self.frame_bytes / self.sample_rate
+            self._cond.notify()
+        return True
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._pending.clear()
+            self._cond.notify()
+
+    def _next_chunks(self):
+        """Every chunk queued so far, or None once the stream is closed"""
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return None
+            chunks, self._pending = list(self._pending), deque()
+            self._pending_bytes = 0
+            return chunks
+
+    def _samples(self, chunks):
+        """Mono float32 samples at the model's rate"""
+        data = self._carry + b''.join(chunk for chunk, _ in chunks)
+        usable = len(data) - len(data) % self.frame_bytes
+        # A sample split across chunks is completed by the next chunk
+        self._carry = data[usable:]
+        pcm = np.frombuffer(data, dtype=self.dtype, count=usable // self.dtype.itemsize)
+        samples = pcm.reshape(-1, self.channels).mean(axis=1, dtype='float32') * self.scale
+        if self.resampler is not None:
+            samples = self.resampler.resample_chunk(samples, last=False)
+        return samples
+
+    def run(self):
+        """Process audio until the stream is closed"""
+        while True:
+            chunks = self._next_chunks()
+            if chunks is None:
+                break
+            result = self._process(chunks)
+            if result is not None:
+                self.emit('voice_result', result)
+
+    def _process(self, chunks):
+        trace = metrics.start_trace('socket:/voice/chunk')
+        status = 200
+        try:
+            with metrics.span('audio_features'):
+                self.features.push(self._samples(chunks))
+            total = self.features.total
+            if total < self._next_end:
+                return None
+            # Windows due since the last pass: infer only the newest one
+            due = 1 + (total - self._next_end) // self.stride_frames
+            self.skipped_windows += due - 1
+            end = self._next_end + (due - 1) * self.stride_frames
+            self._next_end = end + self.stride_frames
+            with metrics.span('audio_features'):
+                features = self.features.window(end)
+            prediction = predict_one('voice', _predict_batch, _fit_length(features, self.model_frames))
+            return self._result(prediction, end, chunks[-1][1])
+        except Exception as e:
+            print(f"Error processing voice stream chunk: {e}")
+            status = 500
+            return {'error': str(e)}
+        finally:
+            # Chunks are counted in the metrics but, at stream rates, not logged
+            metrics.finish_trace(trace, status, log=False)
+
+    def _result(self, prediction, end, received_at):
+        prediction = np.asarray(prediction, dtype='float64')
+        alpha = config.VOICE_STREAM_SMOOTHING
+        if self.smoothed is None or alpha >= 1.0:
+            self.smoothed = prediction
+        else:
+            self.smoothed = alpha * prediction + (1.0 - alpha) * self.smoothed
+        self.windows += 1
+        return {
+            'emotion': CLASSES[int(np.argmax(self.smoothed))],
+            'confidence': float(np.max(self.smoothed)),
+            'probabilities': _probabilities(self.smoothed),
+            'window': {
+                'emotion': CLASSES[int(np.argmax(prediction))],
+                'confidence': float(np.max(prediction)),
+                'start_seconds': (end - self.window_frames) * HOP_LENGTH / SAMPLE_RATE,
+                'end_seconds': end * HOP_LENGTH / SAMPLE_RATE,
+            },
+            'windows': self.windows,
+            'skipped_windows': self.skipped_windows,
+            'dropped_chunks': self.dropped_chunks,
+            'received_seconds': self.received_seconds,
+            'latency_ms': (time.time() - received_at) * 1000.0
+        }
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Production entry point: serves the app with waitress instead of the
+Flask/Werkzeug development server.
+
+    python serve.py --port 5000
+    SERVER_THREADS=32 COMPUTE_WORKERS=8 MAX_IN_FLIGHT=16 python serve.py
+
+waitress threads only read requests and write responses; decode and
+inference run on the app's compute executor (COMPUTE_WORKERS), so slow
+uploads never hold a compute thread. Requests over an endpoint's
+in-flight limit get 429, and requests that find the compute queue full
+get 503, both with Retry-After.
+
+waitress has no WebSocket support, so Socket.IO clients of the realtime
+face stream fall back to HTTP long-polling here. Run `python app.py`
+(or an eventlet/gevent deployment) when the stream needs WebSockets.
+"""
+
+import argparse
+
+from waitress import serve
+
+import config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+
+    import app as app_module
+    from utils import worker_pool
+    if worker_pool.enabled():
+        worker_pool.start()
+
+    print(f"Serving on http://{args.host}:{args.port} with {config.SERVER_THREADS} threads, "
+          f"{app_module.compute_executor.max_workers} compute workers")
+    serve(
+        app_module.app,
+        host=args.host,
+        port=args.port,
+        threads=config.SERVER_THREADS,
+        connection_limit=config.SERVER_CONNECTION_LIMIT,
+        backlog=config.SERVER_BACKLOG,
+        ident='emotion-api'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Test the calibration inputs export_models.py builds from a sample directory
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import soundfile as sf
+
+import config
+from benchmarks.stubs import StubModel
+from export_models import AUDIO_EXTENSIONS, _files, _voice_inputs
+
+
+def test_voice_inputs_from_wav_directory():
+    """A directory of WAV files becomes one stacked feature array"""
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        # Clips of different lengths, all fitted to the window length
+        for i, seconds in enumerate((0.5, 1.0, 4.0)):
+            samples = 0.1 * rng.standard_normal(int(22050 * seconds)).astype('float32')
+            sf.write(os.path.join(directory, f'clip{i}.wav'), samples, 22050)
+        # Not audio: skipped by the extension filter
+        with open(os.path.join(directory, 'notes.txt'), 'w') as f:
+            f.write('not audio')
+
+        inputs = _voice_inputs(_files(directory, AUDIO_EXTENSIONS), StubModel((None, 141, None), 3))
+
+    assert inputs.shape[0] == 3
+    assert inputs.shape[2] == config.VOICE_WINDOW_FRAMES
+    assert np.all(np.isfinite(inputs))
+
+
+if __name__ == '__main__':
+    test_voice_inputs_from_wav_directory()
+    print("✅ Voice calibration inputs OK")
@@ -0,0 +1,151 @@
+"""
+Admission control and compute offloading for the production server.
+
+InFlightLimiter caps the number of requests each endpoint serves at a
+time. A request over the cap is rejected at once with 429 instead of
+queueing behind the others.
+
+ComputeExecutor runs the CPU-heavy part of a request (decode, landmarks,
+inference) on a fixed number of compute threads. The server's I/O
+threads only read uploads and write responses. The executor's queue is
+bounded: when it is full, a request is rejected with 503. A task that is
+still queued when its deadline passes is dropped without running, so
+stale realtime frames are never inferred.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+
+class Rejected(Exception):
+    """The request was not admitted; status is 429 or 503"""
+
+    def __init__(self, message, status=503, retry_after=1):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """The task's deadline passed before it could run"""
+
+
+def parse_limits(spec):
+    """Parse '/api/voice:4,/api/face/realtime:8' into {'/api/voice': 4, ...}"""
+    limits = {}
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        path, _, limit = part.rpartition(':')
+        limits[path.strip()] = int(limit)
+    return limits
+
+
+class InFlightLimiter:
+    """Per-key concurrency caps; keys without an explicit limit get default_limit"""
+
+    def __init__(self, default_limit, limits=None):
+        self.default_limit = default_limit
+        self.limits = dict(limits or {})
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._peak = {}
+        self._rejected = {}
+
+    def limit(self, key):
+        return self.limits.get(key, self.default_limit)
+
+    def try_acquire(self, key):
+        """Take a slot for key; False when the key is at its limit"""
+        with self._lock:
+            current = self._in_flight.get(key, 0)
+            if current >= self.limit(key):
+                self._rejected[key] = self._rejected.get(key, 0) + 1
+                return False
+            self._in_flight[key] = current + 1
+            self._peak[key] = max(self._peak.get(key, 0), current + 1)
+            return True
+
+    def release(self, key):
+        with self._lock:
+            self._in_flight[key] = max(self._in_flight.get(key, 0) - 1, 0)
+
+    def stats(self):
+        with self._lock:
+            keys = set(self._in_flight) | set(self._rejected)
+            return {
+                key: {
+                    'limit': self.limit(key),
+                    'in_flight': self._in_flight.get(key, 0),
+                    'peak_in_flight': self._peak.get(key, 0),
+                    'rejected': self._rejected.get(key, 0),
+                }
+                for key in sorted(keys)
+            }
+
+
+class ComputeExecutor:
+    """Bounded-queue thread pool for request compute, with per-task deadlines"""
+
+    def __init__(self, max_workers, max_queue):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='compute')
+        self._lock = threading.Lock()
+        self._pending = 0  # submitted and not finished (queued + running)
+        self._completed = 0
+        self._rejected = 0
+        self._expired = 0
+
+    def _task(self, fn, args, deadline):
+        try:
+            if deadline is not None and time.monotonic() > deadline:
+                with self._lock:
+                    self._expired += 1
+                raise DeadlineExceeded("Deadline passed while queued")
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._completed += 1
+
+    def run(self, fn, *args, deadline=None):
+        """
+        Run fn(*args) on a compute thread and return its result. deadline is
+        a time.monotonic() value: a task not started by then is dropped and
+        DeadlineExceeded raised. Raises Rejected when the queue is full.
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise Rejected("Server is at capacity, try again later", status=503)
+            self._pending += 1
+        try:
+            future = self._executor.submit(self._task, fn, args, deadline)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            if future.cancel():
+                # Never started: the slot is given back here instead of in _task
+                with self._lock:
+                    self._pending -= 1
+                    self._expired += 1
+                raise DeadlineExceeded("Deadline passed while queued")
+            # Already running: inference is not interruptible, wait for it
+            return future.result()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'pending': self._pending,
+                'queued': max(self._pending - self.max_workers, 0),
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'expired': self._expired,
+            }
@@ -1,29 +1,287 @@
 import numpy as np
-import librosa
-import io
+from functools import lru_cache
+
+from utils.request_input import BufferReader, as_buffer
+
+# librosa and scipy are imported inside the functions that need them, so
+# processes that do not serve voice never import them
+
+N_FFT = 2048
+HOP_LENGTH = 512
+TOP_DB = 80.0
+AMIN = 1e-10
+
+@lru_cache(maxsize=16)
+def _front_end_matrices(sr, n_fft, n_mels, n_mfcc):
+    """
+    STFT window, mel filterbank and DCT-II matrix for one configuration,
+    built once and shared by every request (all float32, read-only)
+    """
+    import librosa
+    # Periodic Hann window, as librosa.stft uses
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype('float32')
+    mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels).astype('float32')
+    # Orthonormal DCT-II, as librosa.feature.mfcc applies to the mel-dB rows
+    k = np.arange(n_mfcc)[:, None]
+    n = np.arange(n_mels)[None, :]
+    dct_matrix = np.cos(np.pi * k * (2 * n + 1) / (2 * n_mels)) * np.sqrt(2.0 / n_mels)
+    dct_matrix[0] /= np.sqrt(2.0)
+    dct_matrix = dct_matrix.astype('float32')
+    for matrix in (window, mel_basis, dct_matrix):
+        matrix.setflags(write=False)
+    return window, mel_basis, dct_matrix
+
+def _mel_power(frames, window, mel_basis):
+    """Mel power spectrogram (n_mels, n_frames) of (n_frames, n_fft) sample frames"""
+    from scipy.fft import rfft
+    # scipy's rfft keeps float32 input in complex64
+    spectrum = rfft(frames * window, axis=1)
+    power = np.square(spectrum.real, dtype='float32') + np.square(spectrum.imag, dtype='float32')
+    return mel_basis @ power.T
+
+def _mel_db(mel_power):
+    """power_to_db with ref=1, before the top_db clip"""
+    return 10.0 * np.log10(np.maximum(mel_power, AMIN))
+
+def _features_from_mel_power(mel_power, dct_matrix):
+    """
+    MFCCs stacked on mel-dB, normalized. One log pass serves both outputs:
+    power_to_db with ref=1 feeds the DCT, and the ref=np.max version is the
+    same array shifted by its maximum (the top_db clip is relative to it).
+    """
+    return _features_from_db(_mel_db(mel_power), dct_matrix)
+
+def _features_from_db(db, dct_matrix):
+    """Features of unclipped mel-dB frames; db is clipped in place"""
+    peak = db.max() if db.size else 0.0
+    np.maximum(db, peak - TOP_DB, out=db)
+    mfccs = dct_matrix @ db
+    features = np.concatenate([mfccs, db - peak])
+    return (features - np.mean(features)) / (np.std(features) + 1e-8)
+
+def compute_audio_features(audio, sr=22050, n_mfcc=13, n_mels=128):
+    """
+    Fused front-end: one STFT and one mel projection produce both the MFCC
+    and mel-dB features, using cached filterbank matrices. Matches the
+    separate librosa.feature.mfcc / melspectrogram calls within float32
+    tolerance.
+    """
+    window, mel_basis, dct_matrix = _front_end_matrices(sr, N_FFT, n_mels, n_mfcc)
+    # Centered framing with zero padding, as librosa.stft(center=True)
+    padded = np.pad(np.asarray(audio, dtype='float32'), N_FFT // 2)
+    frames = np.lib.stride_tricks.sliding_window_view(padded, N_FFT)[::HOP_LENGTH]
+    return _features_from_mel_power(_mel_power(frames, window, mel_basis), dct_matrix)
 
 def extract_audio_features(file, sr=22050, n_mfcc=13, n_mels=128):
     """
     Extract audio features from the uploaded audio file
     """
+    import librosa
     try:
-        # Read audio file
-        audio_bytes = file.read()
-        audio, _ = librosa.load(io.BytesIO(audio_bytes), sr=sr)
-        
-        # Extract MFCCs
-        mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=n_mfcc)
-        
-        # Extract Mel spectrogram
-        mel_spec = librosa.feature.melspectrogram(y=audio, sr=sr, n_mels=n_mels)
-        mel_spec_db = librosa.power_to_db(mel_spec, ref=np.max)
-        
-        # Combine features
-        features = np.concatenate([mfccs, mel_spec_db])
-        
-        # Normalize features
-        features = (features - np.mean(features)) / np.std(features)
-        
-        return features
+        # Read audio file, buffers are decoded in place
+        audio, _ = librosa.load(BufferReader(as_buffer(file)), sr=sr)
+
+        # MFCCs and Mel spectrogram (dB) from a single STFT, normalized
+        return compute_audio_features(audio, sr=sr, n_mfcc=n_mfcc, n_mels=n_mels)
     except Exception as e:
-        raise Exception(f"Error extracting audio features: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Error extracting audio features: {str(e)}")
+
+def audio_duration(file):
+    """
+    Duration in seconds read from the file header, or None if the format
+    cannot be inspected without decoding. The file position is restored.
+    """
+    import soundfile as sf
+    stream = getattr(file, 'stream', file)
+    position = stream.tell()
+    try:
+        info = sf.info(stream)
+        return info.frames / info.samplerate
+    except Exception:
+        return None
+    finally:
+        stream.seek(position)
+
+def iter_audio_blocks(file, sr=22050, block_seconds=5.0):
+    """
+    Decode an audio file block by block, downmix to mono and resample to
+    sr with a streaming resampler, yielding float32 blocks. Only one block
+    is held in memory at a time.
+    """
+    import soundfile as sf
+    import soxr
+
+    stream = getattr(file, 'stream', file)
+    try:
+        sound = sf.SoundFile(stream)
+    except Exception as e:
+        # Formats libsndfile cannot stream (e.g. some compressed codecs)
+        # fall back to a full decode
+        import librosa
+        print(f"⚠️ Streaming decode not available ({e}), decoding the whole file")
+        stream.seek(0)
+        audio, _ = librosa.load(stream, sr=sr)
+        for start in range(0, len(audio), int(block_seconds * sr)):
+            yield audio[start:start + int(block_seconds * sr)]
+        return
+
+    with sound:
+        resampler = None
+        if sound.samplerate != sr:
+            resampler = soxr.ResampleStream(sound.samplerate, sr, 1, dtype='float32')
+        blocksize = int(block_seconds * sound.samplerate)
+        for block in sound.blocks(blocksize=blocksize, dtype='float32', always_2d=True):
+            mono = block.mean(axis=1)
+            if resampler is not None:
+                mono = resampler.resample_chunk(mono, last=False)
+            if len(mono):
+                yield mono
+        if resampler is not None:
+            tail = resampler.resample_chunk(np.zeros(0, dtype='float32'), last=True)
+            if len(tail):
+                yield tail
+
+class StreamingMelFrontEnd:
+    """
+    Incremental STFT and mel projection. Samples are pushed in arbitrary
+    chunks and mel power frames come out as soon as a full n_fft frame is
+    available. Framing matches librosa's centered STFT (n_fft // 2 zeros
+    on both ends), so the concatenated output equals
+    librosa.feature.melspectrogram on the whole signal.
+    """
+
+    def __init__(self, sr=22050, n_fft=N_FFT, hop_length=HOP_LENGTH, n_mels=128, n_mfcc=13):
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.window, self.mel_basis, self.dct_matrix = _front_end_matrices(sr, n_fft, n_mels, n_mfcc)
+        # Carry-over samples between pushes, starting with the center padding
+        self._buffer = np.zeros(n_fft // 2, dtype='float32')
+
+    def push(self, samples):
+        """Add samples, return the new (n_mels, k) mel power frames"""
+        buffer = np.concatenate([self._buffer, np.asarray(samples, dtype='float32')])
+        if len(buffer) < self.n_fft:
+            self._buffer = buffer
+            return np.zeros((self.mel_basis.shape[0], 0), dtype='float32')
+
+        n_frames = 1 + (len(buffer) - self.n_fft) // self.hop_length
+        frames = np.lib.stride_tricks.sliding_window_view(buffer, self.n_fft)[::self.hop_length][:n_frames]
+        mel_power = _mel_power(frames, self.window, self.mel_basis)
+        # Keep the overlap needed by the next frame
+        self._buffer = buffer[n_frames * self.hop_length:]
+        return mel_power
+
+    def flush(self):
+        """Emit the trailing frames covered by the end padding"""
+        return self.push(np.zeros(self.n_fft // 2, dtype='float32'))
+
+class FrameRing:
+    """
+    Fixed-size ring of feature frames (rows x capacity). Appending past
+    capacity overwrites the oldest frames, so memory never grows.
+    """
+
+    def __init__(self, rows, capacity):
+        self.buffer = np.zeros((rows, capacity), dtype='float32')
+        self.capacity = capacity
+        self.total = 0  # frames appended so far
+
+    def append(self, frames):
+        k = frames.shape[1]
+        if k > self.capacity:
+            self.total += k - self.capacity
+            frames, k = frames[:, -self.capacity:], self.capacity
+        start = self.total % self.capacity
+        first = min(k, self.capacity - start)
+        self.buffer[:, start:start + first] = frames[:, :first]
+        self.buffer[:, :k - first] = frames[:, first:]
+        self.total += k
+
+    def read(self, end, n, out):
+        """Copy frames end - n .. end (absolute frame numbers) into out[:, :n]"""
+        if end > self.total or end - n < self.total - self.capacity:
+            raise ValueError(f"Frames {end - n}..{end} are not in the ring")
+        start = (end - n) % self.capacity
+        first = min(n, self.capacity - start)
+        out[:, :first] = self.buffer[:, start:start + first]
+        out[:, first:n] = self.buffer[:, :n - first]
+        return out
+
+class StreamingFeatures:
+    """
+    Features of a live audio stream over a sliding window. Each pushed
+    chunk only runs the STFT, mel projection and log for its new frames;
+    the mel-dB frames are kept in a FrameRing. window(end) then builds the
+    features of the window_frames frames ending at frame end. The top_db
+    clip, DCT and normalization depend on the whole window, so they run
+    per window, on window_frames x n_mels values. Results match what
+    iter_feature_windows gives for the same window of a file.
+    """
+
+    def __init__(self, window_frames, capacity=None, sr=22050, n_mfcc=13, n_mels=128):
+        self.window_frames = window_frames
+        self.front_end = StreamingMelFrontEnd(sr=sr, n_mels=n_mels, n_mfcc=n_mfcc)
+        self.ring = FrameRing(n_mels, capacity or window_frames)
+        self._window = np.empty((n_mels, window_frames), dtype='float32')
+
+    @property
+    def total(self):
+        return self.ring.total
+
+    def push(self, samples):
+        """Add samples; returns the number of new frames"""
+        mel_power = self.front_end.push(samples)
+        if mel_power.shape[1]:
+            self.ring.append(_mel_db(mel_power))
+        return mel_power.shape[1]
+
+    def window(self, end):
+        """Features of the window ending at frame end"""
+        db = self.ring.read(end, self.window_frames, self._window)
+        return _features_from_db(db, self.front_end.dct_matrix)
+
+def iter_feature_windows(file, window_frames, stride_frames=None, sr=22050, n_mfcc=13, n_mels=128):
+    """
+    Stream an audio file into fixed-length feature windows.
+
+    Yields (start_frame, features) where features has the same layout as
+    extract_audio_features (MFCCs stacked on mel-dB, normalized) but covers
+    window_frames STFT frames. Windows advance by stride_frames. Each window
+    is normalized on its own. Memory stays bounded by one decode block plus
+    one window of mel frames, however long the recording is.
+    """
+    stride_frames = stride_frames or window_frames
+    front_end = StreamingMelFrontEnd(sr=sr, n_mels=n_mels, n_mfcc=n_mfcc)
+    dct_matrix = front_end.dct_matrix
+    frames = np.zeros((n_mels, 0), dtype='float32')
+    offset = 0        # frame index of frames[:, 0]
+    next_start = 0    # start frame of the next window
+    covered_end = 0   # end frame of the last emitted window
+
+    def blocks():
+        for block in iter_audio_blocks(file, sr=sr):
+            yield front_end.push(block)
+        yield front_end.flush()
+
+    for new_frames in blocks():
+        frames = np.concatenate([frames, new_frames], axis=1)
+        end = offset + frames.shape[1]
+        while end >= next_start + window_frames:
+            begin = next_start - offset
+            yield next_start, _features_from_mel_power(frames[:, begin:begin + window_frames], dct_matrix)
+            covered_end = next_start + window_frames
+            next_start += stride_frames
+        # Keep only what the next window, or a final end-aligned one, can still need
+        keep_from = max(min(next_start, end - window_frames), offset)
+        frames = frames[:, keep_from - offset:]
+        offset = keep_from
+
+    # Trailing frames that no window covered yet
+    end = offset + frames.shape[1]
+    if end > covered_end and frames.shape[1]:
+        if end <= window_frames:
+            # Clip shorter than one window
+            yield 0, _features_from_mel_power(frames, dct_matrix)
+        else:
+            # One more full-length window, aligned to the end of the clip
+            yield end - window_frames, _features_from_mel_power(frames[:, -window_frames:], dct_matrix)
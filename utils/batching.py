@@ -0,0 +1,194 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FuturesTimeout
+
+import numpy as np
+
+import config
+from utils.metrics import span
+
+
+class MicroBatcher:
+    """
+    Queue single-sample predictions for one model and run them as dynamic
+    batches, bounded by max_batch_size and max_wait_ms
+    """
+
+    def __init__(self, name, predict_fn, max_batch_size=32, max_wait_ms=5.0):
+        self.name = name
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._batched_samples = 0
+        self._max_batch_seen = 0
+        self._peak_queue_depth = 0
+        self._batch_sizes = {}
+        self._total_wait = 0.0
+        self._total_compute = 0.0
+        self._errors = 0
+
+        self._thread = threading.Thread(target=self._run, name=f"batcher-{name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, sample):
+        """Queue one sample and return a Future for its prediction row"""
+        future = Future()
+        with self._cond:
+            self._queue.append((np.asarray(sample), future, time.perf_counter()))
+            depth = len(self._queue)
+            self._cond.notify()
+        with self._stats_lock:
+            self._requests += 1
+            self._peak_queue_depth = max(self._peak_queue_depth, depth)
+        return future
+
+    def predict(self, sample, timeout=None):
+        """
+        Blocking helper: submit one sample and wait for its result, at most
+        timeout seconds (BATCH_RESULT_TIMEOUT_SECONDS by default)
+        """
+        future = self.submit(sample)
+        try:
+            return future.result(timeout or config.BATCH_RESULT_TIMEOUT_SECONDS)
+        except FuturesTimeout:
+            # Not run yet: leave it out of the next batch
+            future.cancel()
+            raise TimeoutError(f"{self.name} prediction timed out")
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._queue)
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+
+            # Wait until the batch is full or the oldest request has waited long enough
+            deadline = self._queue[0][2] + self.max_wait
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            # Only samples of the same shape can be stacked together
+            shape = self._queue[0][0].shape
+            batch = []
+            skipped = deque()
+            while self._queue and len(batch) < self.max_batch_size:
+                item = self._queue.popleft()
+                if item[0].shape == shape:
+                    batch.append(item)
+                else:
+                    skipped.append(item)
+            skipped.extend(self._queue)
+            self._queue = skipped
+        return batch
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                batch = self._next_batch()
+                batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+                if batch:
+                    self._run_batch(batch)
+            except Exception as e:
+                # Keep the thread alive: a dead batcher would hang every later request
+                print(f"⚠️ {self.name} batcher error: {e}")
+                self._fail(batch, e)
+
+    def _fail(self, batch, error):
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _run_batch(self, batch):
+        started = time.perf_counter()
+        try:
+            outputs = self.predict_fn(np.stack([item[0] for item in batch]))
+            if len(outputs) != len(batch):
+                raise ValueError(f"{self.name} model returned {len(outputs)} rows for a batch of {len(batch)}")
+            for i, (_, future, _) in enumerate(batch):
+                future.set_result(outputs[i])
+        except Exception as e:
+            with self._stats_lock:
+                self._errors += 1
+            self._fail(batch, e)
+        finished = time.perf_counter()
+
+        with self._stats_lock:
+            size = len(batch)
+            self._batches += 1
+            self._batched_samples += size
+            self._max_batch_seen = max(self._max_batch_seen, size)
+            self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+            self._total_wait += sum(started - item[2] for item in batch)
+            self._total_compute += finished - started
+
+    def stats(self):
+        """Queue-depth and batch-size statistics for tuning"""
+        depth = self.queue_depth()
+        with self._stats_lock:
+            batches = self._batches
+            samples = self._batched_samples
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'queue_depth': depth,
+                'peak_queue_depth': self._peak_queue_depth,
+                'requests': self._requests,
+                'batches': batches,
+                'errors': self._errors,
+                'avg_batch_size': samples / batches if batches else 0.0,
+                'max_batch_seen': self._max_batch_seen,
+                'batch_size_histogram': dict(sorted(self._batch_sizes.items())),
+                'avg_wait_ms': 1000.0 * self._total_wait / samples if samples else 0.0,
+                'avg_compute_ms': 1000.0 * self._total_compute / batches if batches else 0.0,
+            }
+
+
+# One batcher per model, shared by all request threads
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(name, predict_fn):
+    """Return the shared batcher for a model, creating it on first use"""
+    with _batchers_lock:
+        batcher = _batchers.get(name)
+        if batcher is None:
+            batcher = MicroBatcher(
+                name,
+                predict_fn,
+                max_batch_size=config.BATCH_MAX_SIZE,
+                max_wait_ms=config.BATCH_MAX_WAIT_MS,
+            )
+            _batchers[name] = batcher
+        return batcher
+
+
+def predict_one(name, predict_fn, sample):
+    """
+    Predict a single sample with predict_fn, going through the shared
+    batcher for this model when batching is enabled
+    """
+    with span(f'{name}_predict'):
+        if not config.BATCHING_ENABLED:
+            return predict_fn(np.expand_dims(sample, axis=0))[0]
+        return get_batcher(name, predict_fn).predict(sample)
+
+
+def batcher_stats():
+    """Stats for every batcher created so far"""
+    with _batchers_lock:
+        batchers = dict(_batchers)
+    return {name: batcher.stats() for name, batcher in batchers.items()}
@@ -0,0 +1,126 @@
+"""
+Keras models behind compiled, fixed-shape inference functions.
+
+Keras' model.predict() sets up a data adapter and looks up its predict
+function on every call, and an input of a new shape traces the model
+again. So the first request to each model pays for graph tracing, and so
+does the first request of every new shape. CompiledModel wraps a Keras
+model in a tf.function and keeps concrete functions per input signature,
+with the batch axis always open. Every model gets one over its own input
+shape, so a model with an open axis (the voice model's time axis) is
+served at any length without retracing. Callers may also pad to a few
+lengths and get a static-shape function for each of them. The signatures
+are traced (and the static ones run) once at load time. Every trace is
+counted, so /api/stats and /metrics show whether something still retraces.
+"""
+
+import threading
+
+import numpy as np
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def signatures(input_shape, lengths=()):
+    """
+    Input shapes (without the batch axis) to compile for a model input
+    shape: the shape itself, open axes included, plus one static shape per
+    length when it has a single open axis
+    """
+    dims = tuple(input_shape[1:])
+    open_axes = [i for i, d in enumerate(dims) if d is None]
+    if len(open_axes) != 1:
+        return [dims]
+    axis = open_axes[0]
+    return [dims] + [dims[:axis] + (int(n),) + dims[axis + 1:] for n in sorted(set(lengths))]
+
+
+class CompiledModel:
+    """A Keras model behind per-signature concrete functions and a Keras-like predict()"""
+
+    def __init__(self, name, model):
+        import tensorflow as tf
+        self._tf = tf
+        self.name = name
+        self.model = model
+        self.input_shape = model.input_shape
+        self._function = tf.function(self._call)
+        self._concrete = {}
+        # Concrete function over the model's open axes, once traced
+        self._generic = None
+        self._lock = threading.Lock()
+        self.traces = 0
+        self.retraces = 0
+        self.warm = False
+
+    def _call(self, batch):
+        # The Python body only runs while tracing, which _concrete_for
+        # does under the lock
+        self.traces += 1
+        if self.warm:
+            self.retraces += 1
+        return self.model(batch, training=False)
+
+    def _concrete_for(self, dims):
+        function = self._concrete.get(dims)
+        if function is not None:
+            return function
+        with self._lock:
+            function = self._concrete.get(dims)
+            if function is None:
+                if self.warm:
+                    print(f"⚠️ {self.name} model traced for a new input shape {dims} after warm-up")
+                spec = self._tf.TensorSpec((None,) + dims, self._tf.float32)
+                function = self._function.get_concrete_function(spec)
+                self._concrete[dims] = function
+        return function
+
+    def predict(self, batch, verbose=0):
+        batch = np.asarray(batch, dtype='float32')
+        function = self._concrete.get(batch.shape[1:])
+        if function is None:
+            function = self._generic if self._generic is not None else self._concrete_for(batch.shape[1:])
+        output = function(self._tf.constant(batch))
+        if isinstance(output, (list, tuple)):
+            output = output[0]
+        elif isinstance(output, dict):
+            output = next(iter(output.values()))
+        return output.numpy()
+
+    def warm_up(self, shapes):
+        """Trace every signature and run the static ones once, before the first request"""
+        for dims in map(tuple, shapes):
+            if None in dims:
+                self._concrete_for(dims)
+            else:
+                self.predict(np.zeros((1,) + dims, dtype='float32'))
+        dims = tuple(self.input_shape[1:])
+        if None in dims:
+            self._generic = self._concrete.get(dims)
+        self.warm = True
+
+    def stats(self):
+        return {
+            'signatures': ['x'.join('?' if d is None else str(d) for d in dims) for dims in self._concrete],
+            'traces': self.traces,
+            'retraces': self.retraces
+        }
+
+
+def compile_model(name, model, lengths=()):
+    """Wrap a Keras model in a CompiledModel warmed up on its signatures"""
+    compiled = CompiledModel(name, model)
+    shapes = signatures(compiled.input_shape, lengths)
+    compiled.warm_up(shapes)
+    print(f"✅ {name} model compiled for {len(shapes)} input shape(s)")
+    with _models_lock:
+        _models[name] = compiled
+    return compiled
+
+
+def stats():
+    """Signatures, traces and retraces (traces after warm-up) of each compiled model"""
+    with _models_lock:
+        models = dict(_models)
+    return {name: model.stats() for name, model in models.items()}
@@ -0,0 +1,235 @@
+"""
+Pure-NumPy forward pass for small dense Keras models.
+
+A 20-feature MLP costs microseconds of arithmetic but milliseconds of
+TensorFlow overhead per model.predict call. DenseMLP copies the weights
+of a plain stack of Dense / BatchNormalization / Dropout / activation
+layers out of Keras and runs the same math with NumPy.
+
+Per-feature affine maps are folded into the next Dense kernel, so they
+cost nothing at inference time. This covers a StandardScaler in front of
+the model and inference-time BatchNormalization. The engine can be
+saved to an .npz file, so later starts do not need TensorFlow.
+"""
+
+import os
+
+import numpy as np
+
+
+class NotADenseStack(ValueError):
+    """The Keras model has a layer or topology DenseMLP cannot run"""
+
+
+# Layers that are the identity at inference time
+IDENTITY_LAYERS = (
+    'InputLayer', 'Dropout', 'AlphaDropout', 'GaussianDropout', 'GaussianNoise',
+    'ActivityRegularization', 'Flatten',
+)
+
+SELU_ALPHA = 1.6732632423543772
+SELU_SCALE = 1.0507009873554805
+
+
+def _sigmoid(x):
+    return 0.5 * (np.tanh(0.5 * x) + 1.0)
+
+
+def _softmax(x):
+    x = x - x.max(axis=-1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=-1, keepdims=True)
+    return x
+
+
+def _gelu(x):
+    from scipy.special import erf
+    return 0.5 * x * (1.0 + erf(x / np.sqrt(2.0)))
+
+
+# Activation name -> function of (x, alpha)
+ACTIVATIONS = {
+    'linear': lambda x, alpha: x,
+    'relu': lambda x, alpha: np.maximum(x, 0.0, out=x),
+    'leaky_relu': lambda x, alpha: np.where(x > 0, x, alpha * x),
+    'sigmoid': lambda x, alpha: _sigmoid(x),
+    'tanh': lambda x, alpha: np.tanh(x, out=x),
+    'softmax': lambda x, alpha: _softmax(x),
+    'elu': lambda x, alpha: np.where(x > 0, x, alpha * np.expm1(np.minimum(x, 0.0))),
+    'selu': lambda x, alpha: SELU_SCALE * np.where(x > 0, x, SELU_ALPHA * np.expm1(np.minimum(x, 0.0))),
+    'swish': lambda x, alpha: x * _sigmoid(x),
+    'silu': lambda x, alpha: x * _sigmoid(x),
+    'softplus': lambda x, alpha: np.logaddexp(0.0, x),
+    'gelu': lambda x, alpha: _gelu(x),
+}
+
+
+def _activation_name(activation):
+    name = activation if isinstance(activation, str) else getattr(activation, '__name__', None)
+    if name not in ACTIVATIONS:
+        raise NotADenseStack(f"Unsupported activation: {activation}")
+    return name
+
+
+def _check_chain(model):
+    """Every layer must take the previous layer's output and nothing else"""
+    if len(model.inputs) != 1 or len(model.outputs) != 1:
+        raise NotADenseStack("Model must have exactly one input and one output")
+    if type(model).__name__ == 'Sequential':
+        return
+    layers = model.layers
+    for previous, layer in zip(layers, layers[1:]):
+        try:
+            chained = layer.input is previous.output
+        except AttributeError:
+            chained = False
+        if not chained:
+            raise NotADenseStack(f"Layer {layer.name} is not fed only by {previous.name}")
+
+
+class DenseMLP:
+    """
+    Forward pass as a list of operations:
+    ('dense', kernel, bias), ('affine', scale, shift) and
+    ('activation', name, alpha)
+    """
+
+    def __init__(self, ops):
+        self.ops = ops
+        n_inputs = next(a.shape[0] for kind, a, _ in ops if kind in ('dense', 'affine'))
+        self.input_shape = (None, n_inputs)
+
+    @classmethod
+    def from_keras(cls, model, scaler=None):
+        """
+        Copy a plain dense Keras model. With a fitted StandardScaler the
+        engine takes unscaled features, and scaling is folded into the first
+        Dense kernel. Raises NotADenseStack for anything else.
+        """
+        _check_chain(model)
+        ops = []
+        # Per-feature affine map not yet folded into a Dense kernel
+        pending = None
+
+        if scaler is not None:
+            if not hasattr(scaler, 'scale_') and not hasattr(scaler, 'mean_'):
+                raise NotADenseStack("Scaler is not fitted")
+            n = model.input_shape[-1]
+            scale = scaler.scale_ if getattr(scaler, 'scale_', None) is not None else np.ones(n)
+            mean = scaler.mean_ if getattr(scaler, 'mean_', None) is not None else np.zeros(n)
+            pending = (1.0 / scale, -mean / scale)
+
+        for layer in model.layers:
+            kind = type(layer).__name__
+            config = layer.get_config()
+            if kind in IDENTITY_LAYERS:
+                continue
+            if kind == 'Dense':
+                weights = layer.get_weights()
+                kernel = weights[0].astype(np.float64)
+                bias = weights[1].astype(np.float64) if config.get('use_bias', True) else np.zeros(kernel.shape[1])
+                if pending is not None:
+                    # Dense(x * s + t) = x @ (s[:, None] * W) + (t @ W + b)
+                    scale, shift = pending
+                    bias = shift @ kernel + bias
+                    kernel = scale[:, None] * kernel
+                    pending = None
+                ops.append(('dense', kernel, bias))
+                activation = _activation_name(config.get('activation', 'linear'))
+                if activation != 'linear':
+                    ops.append(('activation', activation, 0.0))
+            elif kind == 'BatchNormalization':
+                axis = config.get('axis', -1)
+                axis = axis[0] if isinstance(axis, (list, tuple)) else axis
+                if axis not in (-1, 1):
+                    raise NotADenseStack(f"BatchNormalization over axis {axis}")
+                mean = layer.moving_mean.numpy().astype(np.float64)
+                variance = layer.moving_variance.numpy().astype(np.float64)
+                gamma = layer.gamma.numpy() if config.get('scale', True) else 1.0
+                beta = layer.beta.numpy() if config.get('center', True) else 0.0
+                # BatchNormalization at inference: (x - mean) / sqrt(var + eps) * gamma + beta
+                scale = gamma / np.sqrt(variance + config['epsilon'])
+                shift = beta - mean * scale
+                if pending is not None:
+                    scale, shift = pending[0] * scale, pending[1] * scale + shift
+                pending = (scale, shift)
+            elif kind in ('Activation', 'ReLU', 'LeakyReLU', 'Softmax', 'ELU'):
+                if pending is not None:
+                    ops.append(('affine', pending[0], pending[1]))
+                    pending = None
+                ops.append(cls._activation_layer(kind, config))
+            else:
+                raise NotADenseStack(f"Unsupported layer: {kind}")
+
+        if pending is not None:
+            ops.append(('affine', pending[0], pending[1]))
+        if not any(kind == 'dense' for kind, _, _ in ops):
+            raise NotADenseStack("Model has no Dense layer")
+        return cls([(kind, *cls._as_float32(kind, a, b)) for kind, a, b in ops])
+
+    @staticmethod
+    def _activation_layer(kind, config):
+        if kind == 'Activation':
+            return ('activation', _activation_name(config['activation']), 0.0)
+        if kind == 'Softmax':
+            if config.get('axis', -1) not in (-1, 1):
+                raise NotADenseStack("Softmax over a non-feature axis")
+            return ('activation', 'softmax', 0.0)
+        if kind == 'ELU':
+            return ('activation', 'elu', float(config.get('alpha', 1.0)))
+        if kind == 'LeakyReLU':
+            return ('activation', 'leaky_relu', float(config.get('alpha', config.get('negative_slope', 0.3))))
+        # ReLU layer: only the plain form
+        if config.get('max_value') is None and not config.get('negative_slope') and not config.get('threshold'):
+            return ('activation', 'relu', 0.0)
+        raise NotADenseStack(f"Unsupported ReLU configuration: {config}")
+
+    @staticmethod
+    def _as_float32(kind, a, b):
+        if kind == 'activation':
+            return a, b
+        # Folding ran in float64; inference runs in float32 like Keras
+        return np.ascontiguousarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+
+    def predict(self, batch, verbose=0):
+        """Probabilities for an (N, features) batch (or a single vector)"""
+        x = np.atleast_2d(np.asarray(batch, dtype=np.float32))
+        for kind, a, b in self.ops:
+            if kind == 'dense':
+                x = x @ a
+                x += b
+            elif kind == 'affine':
+                x = x * a + b
+            else:
+                x = ACTIVATIONS[a](x, b)
+        return x
+
+    def save(self, path, version=''):
+        """Write the engine to an .npz file tagged with the source model version"""
+        arrays = {'version': np.array(version), 'kinds': np.array([kind for kind, _, _ in self.ops])}
+        for i, (kind, a, b) in enumerate(self.ops):
+            if kind == 'activation':
+                arrays[f'op{i}_a'] = np.array(a)
+                arrays[f'op{i}_b'] = np.array(b)
+            else:
+                arrays[f'op{i}_a'], arrays[f'op{i}_b'] = a, b
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, version=''):
+        """The saved engine, or None if the file is missing or was built from another model version"""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if str(data['version']) != version:
+                    return None
+                ops = []
+                for i, kind in enumerate(data['kinds']):
+                    kind = str(kind)
+                    a, b = data[f'op{i}_a'], data[f'op{i}_b']
+                    ops.append((kind, str(a), float(b)) if kind == 'activation' else (kind, a, b))
+                return cls(ops)
+        except (OSError, KeyError, ValueError):
+            return None
@@ -0,0 +1,119 @@
+import threading
+from contextlib import contextmanager
+
+
+class PoolExhausted(Exception):
+    """Raised when every instance of a bounded pool is already checked out"""
+
+
+class FaceMeshPool:
+    """
+    Bounded pool of MediaPipe FaceMesh instances.
+
+    Static instances (static_image_mode=True) are shared between requests:
+    a request checks one out, runs it and puts it back. Tracking instances
+    carry landmark state between frames, so each realtime session gets its
+    own and it is closed when the session ends instead of being reused.
+
+    Checkout never waits for another request to finish: it hands out an
+    idle instance, creates a new one while under the bound, or raises
+    PoolExhausted.
+    """
+
+    def __init__(self, factory, max_static=4, max_tracking=16):
+        self.factory = factory
+        self.max_static = max_static
+        self.max_tracking = max_tracking
+        self._lock = threading.Lock()
+        self._idle_static = []
+        self._static_created = 0
+        self._static_in_use = 0
+        self._tracking_in_use = 0
+        self._peak_static_in_use = 0
+        self._peak_tracking_in_use = 0
+        self._checkouts = 0
+        self._exhausted = 0
+
+    def checkout_static(self):
+        with self._lock:
+            if self._idle_static:
+                mesh = self._idle_static.pop()
+            elif self._static_created < self.max_static:
+                mesh = None
+                self._static_created += 1
+            else:
+                self._exhausted += 1
+                raise PoolExhausted(f"All {self.max_static} static FaceMesh instances are in use")
+            self._static_in_use += 1
+            self._checkouts += 1
+            self._peak_static_in_use = max(self._peak_static_in_use, self._static_in_use)
+
+        if mesh is None:
+            # Build outside the lock, creating a FaceMesh takes a while
+            try:
+                mesh = self.factory(static_image_mode=True)
+            except Exception:
+                with self._lock:
+                    self._static_created -= 1
+                    self._static_in_use -= 1
+                raise
+        return mesh
+
+    def checkin_static(self, mesh):
+        with self._lock:
+            self._static_in_use -= 1
+            self._idle_static.append(mesh)
+
+    @contextmanager
+    def static(self):
+        """Borrow a static-image FaceMesh for the duration of a with block"""
+        mesh = self.checkout_static()
+        try:
+            yield mesh
+        finally:
+            self.checkin_static(mesh)
+
+    def acquire_tracking(self):
+        """Create a dedicated tracking-mode FaceMesh for one session"""
+        with self._lock:
+            if self._tracking_in_use >= self.max_tracking:
+                self._exhausted += 1
+                raise PoolExhausted(f"All {self.max_tracking} tracking FaceMesh instances are in use")
+            self._tracking_in_use += 1
+            self._checkouts += 1
+            self._peak_tracking_in_use = max(self._peak_tracking_in_use, self._tracking_in_use)
+        try:
+            return self.factory(static_image_mode=False)
+        except Exception:
+            with self._lock:
+                self._tracking_in_use -= 1
+            raise
+
+    def release_tracking(self, mesh):
+        # Tracking state belongs to the session, so the instance is not reused
+        try:
+            mesh.close()
+        finally:
+            with self._lock:
+                self._tracking_in_use -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'static': {
+                    'max': self.max_static,
+                    'created': self._static_created,
+                    'idle': len(self._idle_static),
+                    'in_use': self._static_in_use,
+                    'peak_in_use': self._peak_static_in_use,
+                    'utilization': self._static_in_use / self.max_static if self.max_static else 0.0,
+                },
+                'tracking': {
+                    'max': self.max_tracking,
+                    'in_use': self._tracking_in_use,
+                    'peak_in_use': self._peak_tracking_in_use,
+                    'utilization': self._tracking_in_use / self.max_tracking if self.max_tracking else 0.0,
+                },
+                'checkouts': self._checkouts,
+                'exhausted': self._exhausted,
+            }
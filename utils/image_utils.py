@@ -1,33 +1,89 @@
 import cv2
 import numpy as np
-from PIL import Image
-import io
+from PIL import Image, UnidentifiedImageError
 
-def preprocess_image(file):
+from utils.request_input import BufferReader, as_buffer
+
+# Model input size
+IMAGE_SIZE = 224
+
+# Reduced-size grayscale decode flags, largest reduction first. For JPEG,
+# libjpeg applies these during the DCT (it never builds the full-resolution
+# image); other formats are decoded and then downsampled by OpenCV.
+_REDUCED_GRAYSCALE = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+def _decode_flag(image_bytes, size):
+    """Largest reduced decode that still leaves at least size pixels per side"""
+    try:
+        # PIL only parses the header here, the pixels are not decoded
+        width, height = Image.open(BufferReader(image_bytes)).size
+    except Exception:
+        return cv2.IMREAD_GRAYSCALE
+    for factor, flag in _REDUCED_GRAYSCALE:
+        if min(width, height) // factor >= size:
+            return flag
+    return cv2.IMREAD_GRAYSCALE
+
+def decode_grayscale(image_bytes, size=IMAGE_SIZE):
+    """
+    Decode image bytes straight to an 8-bit grayscale array, at reduced
+    resolution when the image is much larger than size. Raises ValueError
+    when the bytes are not a readable image.
+    """
+    if not len(image_bytes):
+        raise ValueError("Empty image")
+    buffer = np.frombuffer(image_bytes, np.uint8)
+    # Like the PIL decode this replaces, do not apply EXIF rotation
+    flag = _decode_flag(image_bytes, size) | cv2.IMREAD_IGNORE_ORIENTATION
+    image = cv2.imdecode(buffer, flag)
+    if image is None:
+        # Formats OpenCV cannot read (e.g. GIF) go through PIL
+        try:
+            image = np.array(Image.open(BufferReader(image_bytes)).convert('L'))
+        except (UnidentifiedImageError, OSError):
+            # PIL's message names the reader object; report the upload instead
+            raise ValueError("Could not read image") from None
+    return image
+
+def preprocess_image(file, out=None):
     """
-    Preprocess the uploaded image file for model input
+    Preprocess the uploaded image (a file object or a bytes-like buffer)
+    for model input. The (224, 224, 1) float32 result is written into out
+    when given, so callers can reuse one preallocated buffer across requests.
     """
     try:
-        # Read image file
-        image_bytes = file.read()
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Convert to numpy array
-        image = np.array(image)
-        
-        # Convert to grayscale if needed
-        if len(image.shape) == 3:
-            image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-        
+        # Read image file, buffers are used in place
+        image_bytes = as_buffer(file)
+
+        # Decode to grayscale, at reduced resolution for large images
+        image = decode_grayscale(image_bytes)
+
         # Resize to model input size (assuming 224x224)
-        image = cv2.resize(image, (224, 224))
-        
-        # Normalize pixel values
-        image = image.astype('float32') / 255.0
-        
-        # Add channel dimension if needed
-        image = np.expand_dims(image, axis=-1)
-        
-        return image
+        image = cv2.resize(image, (IMAGE_SIZE, IMAGE_SIZE), interpolation=cv2.INTER_AREA)
+
+        # Normalize pixel values into the output buffer (with channel dimension)
+        if out is None:
+            out = np.empty((IMAGE_SIZE, IMAGE_SIZE, 1), dtype='float32')
+        np.multiply(image, 1.0 / 255.0, out=out[..., 0], casting='unsafe')
+
+        return out
+    except ValueError:
+        # Unreadable upload: the caller answers 400
+        raise
     except Exception as e:
-        raise Exception(f"Error preprocessing image: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Error preprocessing image: {str(e)}")
+
+def preprocess_images(files, out=None):
+    """
+    Preprocess a batch of image files into one stacked (N, 224, 224, 1)
+    float32 tensor, filling a preallocated array slice by slice
+    """
+    if out is None:
+        out = np.empty((len(files), IMAGE_SIZE, IMAGE_SIZE, 1), dtype='float32')
+    for i, file in enumerate(files):
+        preprocess_image(file, out=out[i])
+    return out
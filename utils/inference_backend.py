@@ -0,0 +1,177 @@
+"""
+Inference backends for the exported models.
+
+export_models.py converts the Keras models to TFLite or ONNX, optionally
+quantized to float16 or int8. At load time a handler asks this module for
+its model. With INFERENCE_BACKEND=keras, or when no exported file exists
+yet, it gets the Keras model. Otherwise it gets a wrapper around the
+lightweight runtime. The wrappers expose the small part of the Keras API
+the handlers use (input_shape and predict), so the rest of the pipeline
+does not change with the backend. Keras models are served through
+compiled, warmed-up predict functions (utils/compiled_predict.py) unless
+COMPILED_PREDICT is off.
+"""
+
+import os
+import threading
+
+import numpy as np
+
+import config
+from utils.result_cache import model_version as model_version_of
+
+BACKENDS = ('keras', 'tflite', 'onnx')
+PRECISIONS = ('fp32', 'fp16', 'int8')
+EXTENSIONS = {'tflite': 'tflite', 'onnx': 'onnx'}
+
+
+def parse_overrides(spec):
+    """Parse 'voice:keras,face:onnx' into {'voice': 'keras', 'face': 'onnx'}"""
+    overrides = {}
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        name, _, backend = part.partition(':')
+        backend = backend.strip()
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown inference backend for {name.strip()}: {backend}")
+        overrides[name.strip()] = backend
+    return overrides
+
+
+def backend_for(name):
+    """Configured backend of model `name`"""
+    backend = parse_overrides(config.INFERENCE_BACKEND_OVERRIDES).get(name, config.INFERENCE_BACKEND)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    return backend
+
+
+def exported_path(name, backend, precision, export_dir=None):
+    """Where export_models.py writes model `name` for a backend and precision"""
+    return os.path.join(export_dir or config.EXPORTED_MODELS_DIR,
+                        f"{name}.{precision}.{EXTENSIONS[backend]}")
+
+
+def selected_path(name):
+    """The exported file model `name` will be served from, or None for Keras"""
+    backend = backend_for(name)
+    if backend == 'keras':
+        return None
+    path = exported_path(name, backend, config.INFERENCE_PRECISION)
+    return path if os.path.exists(path) else None
+
+
+def model_version(name, *keras_paths):
+    """
+    Version string of model `name` as it will be served: the exported file
+    when one is selected, the Keras files otherwise
+    """
+    path = selected_path(name)
+    if path is None:
+        return model_version_of(*keras_paths)
+    return model_version_of(path) + f"|{backend_for(name)}"
+
+
+def _dims(shape):
+    """Static dims of a runtime input shape, with dynamic ones as None"""
+    return tuple(d if isinstance(d, int) and d > 0 else None for d in shape)
+
+
+class TFLiteModel:
+    """A TFLite interpreter behind a Keras-like predict()"""
+
+    def __init__(self, path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        self.path = path
+        self._interpreter = Interpreter(model_path=path, num_threads=num_threads or None)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        signature = self._input.get('shape_signature', self._input['shape'])
+        self.input_shape = (None,) + _dims(signature[1:])
+        self._batch_size = int(self._input['shape'][0])
+        # An interpreter must not be invoked from two threads at once
+        self._lock = threading.Lock()
+
+    def predict(self, batch, verbose=0):
+        batch = np.asarray(batch)
+        with self._lock:
+            if batch.shape != tuple(self._input['shape']):
+                self._interpreter.resize_tensor_input(self._input['index'], batch.shape)
+                self._interpreter.allocate_tensors()
+                self._input = self._interpreter.get_input_details()[0]
+                self._output = self._interpreter.get_output_details()[0]
+            scale, zero_point = self._input['quantization']
+            if scale:
+                # Fully integer model: quantize the input ourselves
+                batch = np.round(batch / scale + zero_point)
+            self._interpreter.set_tensor(self._input['index'], batch.astype(self._input['dtype']))
+            self._interpreter.invoke()
+            output = self._interpreter.get_tensor(self._output['index'])
+            scale, zero_point = self._output['quantization']
+            if scale:
+                output = (output.astype('float32') - zero_point) * scale
+            return np.array(output, dtype='float32')
+
+
+class ONNXModel:
+    """An ONNX Runtime session behind a Keras-like predict()"""
+
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+        self.path = path
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self._session = ort.InferenceSession(path, sess_options=options,
+                                             providers=['CPUExecutionProvider'])
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        self._input_dtype = np.float16 if model_input.type == 'tensor(float16)' else np.float32
+        self.input_shape = (None,) + _dims(model_input.shape[1:])
+
+    def predict(self, batch, verbose=0):
+        # InferenceSession.run is thread-safe
+        output = self._session.run(None, {self._input_name: np.asarray(batch, dtype=self._input_dtype)})[0]
+        return np.asarray(output, dtype='float32')
+
+
+RUNTIMES = {'tflite': TFLiteModel, 'onnx': ONNXModel}
+
+
+def open_exported(path, backend, num_threads=None):
+    """Load an exported model file with its runtime"""
+    return RUNTIMES[backend](path, num_threads=num_threads)
+
+
+def compiled(name, model, lengths=()):
+    """
+    A Keras model behind its compiled predict function, warmed up on its
+    input shape (or on each of `lengths` for its open axis). Anything else
+    (exported runtimes, mocks) is returned as is.
+    """
+    if not config.COMPILED_PREDICT or isinstance(model, tuple(RUNTIMES.values())):
+        return model
+    if not (hasattr(model, 'input_shape') and callable(model)):
+        return model
+    from utils.compiled_predict import compile_model
+    return compile_model(name, model, lengths)
+
+
+def load(name, keras_loader, lengths=()):
+    """
+    Model `name` on the configured backend. Falls back to keras_loader()
+    when the Keras backend is selected or the exported file is missing;
+    `lengths` are the lengths its open input axis is compiled for.
+    """
+    backend = backend_for(name)
+    if backend != 'keras':
+        path = exported_path(name, backend, config.INFERENCE_PRECISION)
+        if os.path.exists(path):
+            model = open_exported(path, backend, config.INFERENCE_BACKEND_THREADS)
+            print(f"✅ {name} model served by {backend} ({config.INFERENCE_PRECISION}) from {path}")
+            return model
+        print(f"⚠️ {path} not found (run export_models.py); serving {name} with Keras")
+    return compiled(name, keras_loader(), lengths)
@@ -0,0 +1,248 @@
+"""
+Request tracing and Prometheus-style metrics.
+
+Each HTTP request (and each realtime socket frame) gets a Trace, bound to
+the thread that serves it. Pipeline stages are timed with
+`with span('imdecode'):`. A span adds its duration to the current trace
+and to a per-endpoint, per-stage histogram. When the request finishes,
+its total time goes into a per-endpoint histogram and, if enabled, one
+JSON log line with all stage timings.
+
+render() writes every metric in the Prometheus text exposition format.
+State owned by other components (model registry, result cache,
+batchers, FaceMesh pool) comes from collector callbacks run at scrape
+time, so it costs nothing on the request path. A span costs two
+perf_counter calls and one locked histogram update.
+"""
+
+import bisect
+import json
+import logging
+import threading
+import time
+
+import config
+
+# Latency buckets in seconds, from sub-millisecond stages to slow uploads
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+request_log = logging.getLogger('emotion_api.requests')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label combination"""
+
+    def __init__(self, name, help, labelnames, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {series[-2]!r}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter per label combination"""
+
+    def __init__(self, name, help, labelnames):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            snapshot = dict(self._values)
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(snapshot.items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}')
+        return lines
+
+
+STAGE_SECONDS = Histogram('emotion_api_stage_seconds', 'Time spent in one pipeline stage',
+                          ('endpoint', 'stage'))
+REQUEST_SECONDS = Histogram('emotion_api_request_seconds', 'Total time to serve a request',
+                            ('endpoint', 'status'))
+REQUESTS = Counter('emotion_api_requests_total', 'Requests served', ('endpoint', 'status'))
+
+_collectors = []
+_local = threading.local()
+
+
+class Trace:
+    """Stage timings of one request, in milliseconds"""
+
+    __slots__ = ('endpoint', 'started', 'stages', '_lock')
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages = {}
+        # Batch requests time stages from several worker threads
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds * 1000.0
+
+
+class span:
+    """Time a pipeline stage: `with span('imdecode'): ...`"""
+
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not config.METRICS_ENABLED:
+            return False
+        elapsed = time.perf_counter() - self.started
+        trace = getattr(_local, 'trace', None)
+        if trace is None:
+            STAGE_SECONDS.observe(elapsed, 'background', self.stage)
+        else:
+            trace.add(self.stage, elapsed)
+            STAGE_SECONDS.observe(elapsed, trace.endpoint, self.stage)
+        return False
+
+
+def start_trace(endpoint):
+    """Begin tracing a request in the current thread"""
+    trace = Trace(endpoint)
+    _local.trace = trace
+    return trace
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+class use_trace:
+    """Attribute spans in this thread to another thread's trace (e.g. batch workers)"""
+
+    __slots__ = ('trace', 'previous')
+
+    def __init__(self, trace):
+        self.trace = trace
+
+    def __enter__(self):
+        self.previous = getattr(_local, 'trace', None)
+        _local.trace = self.trace
+        return self.trace
+
+    def __exit__(self, *exc_info):
+        _local.trace = self.previous
+        return False
+
+
+def finish_trace(trace, status, log=True, **fields):
+    """
+    Record the request's total time and, when request logging is on,
+    write one JSON line with its stage timings and the given fields
+    """
+    if getattr(_local, 'trace', None) is trace:
+        _local.trace = None
+    if not config.METRICS_ENABLED:
+        return
+    elapsed = time.perf_counter() - trace.started
+    REQUEST_SECONDS.observe(elapsed, trace.endpoint, str(status))
+    REQUESTS.inc(trace.endpoint, str(status))
+    if log and config.REQUEST_LOG and request_log.isEnabledFor(logging.INFO):
+        with trace._lock:
+            stages = {stage: round(ms, 3) for stage, ms in trace.stages.items()}
+        request_log.info(json.dumps({
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'endpoint': trace.endpoint,
+            'status': status,
+            'duration_ms': round(elapsed * 1000.0, 3),
+            'stages': stages,
+            **fields,
+        }))
+
+
+def configure_request_log():
+    """Send request log lines, as bare JSON, to stderr unless already configured"""
+    if not request_log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        request_log.addHandler(handler)
+        request_log.setLevel(logging.INFO)
+        request_log.propagate = False
+
+
+def register_collector(collect):
+    """
+    Add a scrape-time source of metrics. collect() returns
+    (name, type, help, [(labels dict, value), ...]) tuples.
+    """
+    _collectors.append(collect)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = STAGE_SECONDS.render() + REQUEST_SECONDS.render() + REQUESTS.render()
+    for collect in _collectors:
+        try:
+            families = collect()
+        except Exception as e:
+            lines.append(f'# collector {getattr(collect, "__name__", collect)} failed: {_escape(e)}')
+            continue
+        for name, kind, help, samples in families:
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f'{name}{_labels(labels.keys(), labels.values())} {_number(value)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,115 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ModelUnavailable(Exception):
+    """The requested model is not registered or failed to load"""
+
+
+class _Entry:
+    def __init__(self, loader):
+        self.loader = loader
+        self.state = 'pending'
+        self.model = None
+        self.error = None
+        self.started_at = None
+        self.load_seconds = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """
+    Central place where models are loaded, once each.
+
+    Handlers register a loader per model at import time; nothing heavy is
+    imported or loaded until start() loads the enabled models in parallel
+    background threads, or a request asks for a model with get(). A get()
+    for a model that is still loading waits for that load to finish.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = _Entry(loader)
+
+    def _entry(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is None:
+            raise ModelUnavailable(f"Unknown model: {name}")
+        return entry
+
+    def _load(self, name):
+        entry = self._entry(name)
+        with entry.lock:
+            if entry.state in ('ready', 'failed'):
+                return
+            entry.state = 'loading'
+            entry.started_at = time.time()
+            start = time.perf_counter()
+            try:
+                entry.model = entry.loader()
+                entry.state = 'ready'
+                print(f"✅ {name} model ready in {time.perf_counter() - start:.1f}s")
+            except Exception as e:
+                entry.error = str(e)
+                entry.state = 'failed'
+                print(f"⚠️ Warning: Could not load {name} model: {e}")
+            finally:
+                entry.load_seconds = time.perf_counter() - start
+
+    def start(self, names, max_workers=4):
+        """Load the given models in parallel background threads"""
+        executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='model-loader')
+        for name in names:
+            executor.submit(self._load, name)
+        # Let the loads finish in the background
+        executor.shutdown(wait=False)
+
+    def get(self, name):
+        """The loaded model, loading it now (or waiting for its load) if needed"""
+        entry = self._entry(name)
+        if entry.state != 'ready':
+            self._load(name)
+        if entry.state == 'failed':
+            raise ModelUnavailable(f"{name} model is not available: {entry.error}")
+        return entry.model
+
+    def set(self, name, model):
+        """Install an already built model (e.g. a stub) as ready"""
+        self.register(name, lambda: model)
+        entry = self._entry(name)
+        with entry.lock:
+            entry.model = model
+            entry.state = 'ready'
+            entry.error = None
+            entry.load_seconds = 0.0
+
+    def is_ready(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+        return entry is not None and entry.state == 'ready'
+
+    def status(self, names=None):
+        """State, load time and error of each model"""
+        with self._lock:
+            entries = dict(self._entries)
+        if names is not None:
+            entries = {name: entries[name] for name in names if name in entries}
+        return {
+            name: {
+                'state': entry.state,
+                'load_seconds': entry.load_seconds,
+                'error': entry.error,
+            }
+            for name, entry in entries.items()
+        }
+
+
+# Shared by all handlers
+registry = ModelRegistry()
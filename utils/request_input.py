@@ -0,0 +1,195 @@
+"""
+Request input layer shared by the upload endpoints.
+
+An upload arrives either as a raw binary body (Content-Type image/*,
+audio/* or application/octet-stream) or as a field of a multipart form.
+Raw bodies are read from the socket straight into a reusable per-thread
+buffer. Multipart files are already spooled by the form parser; they are
+copied once into such a buffer, instead of a read() into a new bytes
+object plus an io.BytesIO copy. Either way the handlers get a memoryview,
+which goes to np.frombuffer/cv2.imdecode as is and to soundfile through a
+BufferReader, without another copy.
+
+Size limits are checked against Content-Length or the spooled file size
+before anything is read or decoded.
+
+A view is only valid while the request that read it is being served: the
+next request on the same thread reuses the buffer. Callers that keep the
+data (e.g. batch items) must copy it.
+"""
+
+import io
+import threading
+
+import config
+
+RAW_TYPES = ('application/octet-stream',)
+RAW_PREFIXES = ('image/', 'audio/')
+# Multipart framing (boundaries, part headers) around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+CHUNK_SIZE = 64 * 1024
+
+_local = threading.local()
+
+
+class InputError(Exception):
+    """The upload is unusable; status is 400, or 413 when it is too large"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class BufferReader(io.RawIOBase):
+    """Seekable read-only file over a buffer; readinto() copies only what is asked for"""
+
+    def __init__(self, buffer):
+        super().__init__()
+        self._view = memoryview(buffer).cast('B')
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(len(b), len(self._view) - self._position)
+        if n <= 0:
+            return 0
+        memoryview(b).cast('B')[:n] = self._view[self._position:self._position + n]
+        self._position += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self._view) + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self._position = position
+        return position
+
+    def tell(self):
+        return self._position
+
+    def getbuffer(self):
+        return self._view
+
+    def close(self):
+        if not self.closed:
+            # Give the underlying buffer back (e.g. a shared memory segment)
+            self._view.release()
+        super().close()
+
+
+def as_buffer(file):
+    """Bytes-like view of an upload: buffers as they are, file objects read once"""
+    if isinstance(file, (bytes, bytearray, memoryview)):
+        return file
+    if isinstance(file, BufferReader):
+        return file.getbuffer()
+    return file.read()
+
+
+def check_size(size, max_bytes):
+    if size is not None and size > max_bytes:
+        raise InputError(f"Upload exceeds {max_bytes / (1024 * 1024):g} MB", status=413)
+
+
+def _reusable(size, slot):
+    """
+    View of size bytes of this thread's buffer for slot. Buffers grow to
+    the largest upload seen, up to INPUT_BUFFER_REUSE_MB; larger uploads,
+    and uploads with no slot (data that is kept), get a buffer of their own.
+    """
+    if slot is None or size > config.INPUT_BUFFER_REUSE_MB * 1024 * 1024:
+        return memoryview(bytearray(size))
+    buffers = getattr(_local, 'buffers', None)
+    if buffers is None:
+        buffers = _local.buffers = {}
+    buffer = buffers.get(slot)
+    if buffer is None or len(buffer) < size:
+        buffer = buffers[slot] = bytearray(max(size, 2 * len(buffer or b'')))
+    return memoryview(buffer)[:size]
+
+
+def _read_into(stream, view):
+    """Fill view from stream; returns the number of bytes read"""
+    readinto = getattr(stream, 'readinto', None)
+    n = 0
+    while n < len(view):
+        if readinto is not None:
+            got = readinto(view[n:])
+        else:
+            chunk = stream.read(min(len(view) - n, CHUNK_SIZE))
+            got = len(chunk)
+            view[n:n + got] = chunk
+        if not got:
+            break
+        n += got
+    return n
+
+
+def read_body(request, max_bytes, slot='body'):
+    """The raw request body as a memoryview into a reusable buffer; None when empty"""
+    length = request.content_length
+    check_size(length, max_bytes)
+    if length is None:
+        # Chunked upload of unknown size: read one byte past the limit to detect overflow
+        data = request.stream.read(max_bytes + 1)
+        check_size(len(data), max_bytes)
+        return memoryview(data) if data else None
+    if length == 0:
+        return None
+    view = _reusable(length, slot)
+    n = _read_into(request.stream, view)
+    if n < length:
+        raise InputError("Request body ended before Content-Length bytes")
+    return view
+
+
+def upload_view(file, max_bytes, slot):
+    """A multipart file as a memoryview into a reusable buffer (a private one when slot is None)"""
+    stream = file.stream
+    try:
+        size = stream.seek(0, io.SEEK_END)
+        stream.seek(0)
+    except (AttributeError, OSError, ValueError):
+        # Not seekable: read one byte past the limit to detect overflow
+        data = file.read(max_bytes + 1)
+        check_size(len(data), max_bytes)
+        return memoryview(data)
+    check_size(size, max_bytes)
+    view = _reusable(size, slot)
+    return view[:_read_into(stream, view)]
+
+
+def is_raw(request):
+    mimetype = request.mimetype or ''
+    return mimetype in RAW_TYPES or mimetype.startswith(RAW_PREFIXES)
+
+
+def request_payload(request, field, max_bytes=None, max_body=None):
+    """
+    The upload of an endpoint as a memoryview: the raw body for binary
+    content types, else the multipart file `field`. None when there is no
+    upload or it is empty. max_body bounds a whole multipart body (default: one file's
+    worth) and is checked before the form is parsed.
+    """
+    max_bytes = max_bytes or int(config.UPLOAD_MAX_MB * 1024 * 1024)
+    if is_raw(request):
+        return read_body(request, max_bytes)
+    if request.mimetype and request.mimetype.startswith('multipart/'):
+        check_size(request.content_length, (max_body or max_bytes) + MULTIPART_OVERHEAD)
+    file = request.files.get(field)
+    if not file:
+        return None
+    view = upload_view(file, max_bytes, slot=field)
+    return view if len(view) else None
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Content-addressed cache of analysis results.
+
+    Keys are a hash of the uploaded bytes plus the model version, so a
+    resubmitted file skips the whole pipeline while a model update never
+    serves stale results. The in-memory tier is an LRU bounded by the
+    serialized size of its entries. An optional on-disk tier stores one
+    JSON file per key and survives restarts; disk hits are promoted back
+    into memory.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir or None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (result, size)
+        self._bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def key(namespace, data, version):
+        """Hash of the raw upload bytes, the endpoint namespace and the model version"""
+        digest = hashlib.blake2b(data, digest_size=20)
+        digest.update(b'\0' + namespace.encode() + b'\0' + version.encode())
+        return digest.hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + '.json')
+
+    def get(self, key):
+        """Cached result for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                    serialized = f.read()
+                result = json.loads(serialized)
+                self._store(key, result, len(serialized))
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                return result
+            except (OSError, ValueError):
+                pass
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, result):
+        """Cache a successful result (must be JSON serializable)"""
+        serialized = json.dumps(result)
+        self._store(key, result, len(serialized))
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(serialized)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"⚠️ Could not write result cache entry: {e}")
+
+    def _store(self, key, result, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (result, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'disk_tier': bool(self.disk_dir),
+            }
+
+
+def model_version(*paths):
+    """
+    Version string for a model made of the given files: name, size and
+    modification time of each, so replacing a file changes the version
+    """
+    parts = []
+    for path in paths:
+        try:
+            info = os.stat(path)
+            parts.append(f"{os.path.basename(path)}:{info.st_size}:{int(info.st_mtime)}")
+        except OSError:
+            parts.append(f"{os.path.basename(path)}:missing")
+    return '|'.join(parts)
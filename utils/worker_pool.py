@@ -0,0 +1,170 @@
+"""
+Process-pool execution mode for inference.
+
+Each worker process loads its models once, runs a dummy warm-up predict
+and then serves requests. The web process decodes the upload and passes
+the resulting array through shared memory, so only a small descriptor is
+pickled per request and CPU-bound work runs outside the web process's GIL.
+"""
+
+import multiprocessing as mp
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import config
+from utils.metrics import span
+
+MODELS = ('face', 'handwriting', 'voice')
+
+# Pools keyed by name; each entry is (multiprocessing.Pool, models it serves)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def enabled():
+    return config.INFERENCE_MODE == 'process'
+
+
+def parse_affinity(spec):
+    """Parse 'face:2,voice:1' into {'face': 2, 'voice': 1}"""
+    affinity = {}
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        name, _, count = part.partition(':')
+        name = name.strip()
+        if name not in MODELS:
+            raise ValueError(f"Unknown model in WORKER_AFFINITY: {name}")
+        affinity[name] = int(count or 1)
+    return affinity
+
+
+def _warm_up(name):
+    """Load one model inside a worker and run a dummy predict through it"""
+    if name == 'face':
+        from handlers import face_handler
+        face_handler.load_models()
+        face_handler.load_emotion_model()
+        face_handler.classify_batch(np.zeros((1, face_handler.N_FEATURES), dtype='float32'))
+        face_handler._predict_emotion_batch(np.zeros((1, 48, 48, 1), dtype='float32'))
+        with face_handler.mesh_pool.static() as mesh:
+            mesh.process(np.zeros((64, 64, 3), dtype=np.uint8))
+    elif name == 'handwriting':
+        from handlers import handwriting_handler
+        handwriting_handler.predict_from_tensor(np.zeros((224, 224, 1), dtype='float32'))
+    elif name == 'voice':
+        from handlers import voice_handler
+        voice_model = voice_handler.load_voice_model()
+        if voice_model is not None:
+            _, n_features, n_frames = voice_model.input_shape
+            voice_handler._predict_batch(np.zeros((1, n_features, n_frames or config.VOICE_WINDOW_FRAMES), dtype='float32'))
+
+
+def _init_worker(models):
+    # The pool already spreads requests over processes; micro-batching
+    # inside a single-threaded worker would only add waiting time
+    config.BATCHING_ENABLED = False
+    for name in models:
+        try:
+            _warm_up(name)
+            print(f"✅ Worker {mp.current_process().name} ready for {name}")
+        except Exception as e:
+            print(f"⚠ Worker {mp.current_process().name} could not warm up {name}: {e}")
+
+
+def _dispatch(name, array, options):
+    if name == 'face':
+        from handlers.face_handler import predict_from_image_array
+        return predict_from_image_array(array)
+    if name == 'handwriting':
+        from handlers.handwriting_handler import predict_from_tensor
+        return predict_from_tensor(array)
+    if name == 'voice':
+        from handlers.voice_handler import predict_from_audio
+        from utils.request_input import BufferReader
+        # Compressed audio is decoded in the worker as well: librosa's
+        # decode and resample are the CPU-heavy part of this pipeline.
+        # It is read straight from the shared segment
+        reader = BufferReader(array)
+        try:
+            # streaming=True goes through predict_from_audio_stream
+            return predict_from_audio(reader, streaming=options.get('streaming'))
+        finally:
+            reader.close()
+    return {'error': f'Unknown model: {name}'}, 500
+
+
+def _run_task(name, shm_name, shape, dtype, options):
+    """Attach to the shared input array and run the model on it"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        result = _dispatch(name, array, options)
+        # Drop the view before closing, the segment cannot close while it is exported
+        del array
+        return result
+    finally:
+        shm.close()
+
+
+def start():
+    """Start all worker pools; workers preload and warm up their models"""
+    with _pools_lock:
+        if _pools:
+            return
+        ctx = mp.get_context('spawn')
+        # Dedicated pools only for served models; workers import TF/MediaPipe
+        affinity = {name: count for name, count in parse_affinity(config.WORKER_AFFINITY).items()
+                    if name in config.ENABLED_MODALITIES}
+        for name, count in affinity.items():
+            _pools[name] = (ctx.Pool(count, initializer=_init_worker, initargs=((name,),)), (name,))
+        shared = tuple(m for m in MODELS if m not in affinity and m in config.ENABLED_MODALITIES)
+        if shared:
+            pool = ctx.Pool(config.WORKER_COUNT, initializer=_init_worker, initargs=(shared,))
+            _pools['default'] = (pool, shared)
+        print(f"✅ Started inference workers: "
+              + ", ".join(f"{name} -> {', '.join(models)}" for name, (_, models) in _pools.items()))
+
+
+def started():
+    with _pools_lock:
+        return bool(_pools)
+
+
+def shutdown():
+    with _pools_lock:
+        for pool, _ in _pools.values():
+            pool.terminate()
+        _pools.clear()
+
+
+def _pool_for(name):
+    start()
+    for pool, models in _pools.values():
+        if name in models:
+            return pool
+    raise ValueError(f"No worker pool serves model: {name}")
+
+
+def run(name, array, timeout=None, **options):
+    """
+    Run model `name` on a decoded input array in a worker process and
+    return the handler's result. options are passed on to the handler
+    (e.g. streaming for voice). A task whose worker died is never
+    answered, so the wait is bounded by WORKER_TASK_TIMEOUT_SECONDS and
+    ends in a 503 result.
+    """
+    timeout = timeout or config.WORKER_TASK_TIMEOUT_SECONDS
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    try:
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        with span('worker'):
+            pending = _pool_for(name).apply_async(_run_task, (name, shm.name, array.shape, array.dtype.str, options))
+            try:
+                return pending.get(timeout)
+            except mp.TimeoutError:
+                return {'error': f'{name} worker did not answer within {timeout:g}s'}, 503
+    finally:
+        shm.close()
+        shm.unlink()